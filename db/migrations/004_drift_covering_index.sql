@@ -0,0 +1,37 @@
+-- ============================================================================
+-- Drift Detector: Covering Index on transaction_features
+-- ============================================================================
+-- The drift detector reads the oldest and newest N rows ordered by
+-- transaction_id (see services/drift_detector/reference_data.py). With
+-- every selected column in the index, Postgres can answer those queries
+-- with an Index Only Scan instead of a heap lookup per row.
+--
+-- CONCURRENTLY so it can also be applied to a live database without
+-- blocking writes (run outside a transaction block).
+-- Keep the INCLUDE list in sync with FEATURE_SELECT.
+-- ============================================================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_features_txn_id_drift
+    ON transaction_features(transaction_id)
+    INCLUDE (
+        amount,
+        amount_zscore,
+        user_avg_amount_30d,
+        user_txn_count_1h,
+        user_txn_count_24h,
+        user_txn_count_7d,
+        user_amount_sum_1h,
+        user_amount_sum_24h,
+        country_change_flag,
+        device_change_flag,
+        unique_countries_24h,
+        unique_merchants_24h,
+        user_merchant_first_time,
+        hour_of_day,
+        day_of_week,
+        is_weekend,
+        is_night,
+        minutes_since_last_txn,
+        channel_encoded,
+        label
+    );
@@ -0,0 +1,43 @@
+-- ============================================================================
+-- Drift Detector: Covering Index on transaction_features(id)
+-- ============================================================================
+-- The drift windows are now taken in insertion order: the first N ids
+-- (reference) and the ids above MAX(id) - N (current), see
+-- services/drift_detector/reference_data.py. transaction_id is a random
+-- UUID, so the covering index from 004 no longer matches any drift query.
+--
+-- This index serves both windows with an Index Only Scan. The primary key
+-- on id already gives the ordering, but without the INCLUDE list each row
+-- would still need a heap lookup.
+--
+-- CONCURRENTLY so it can also be applied to a live database without
+-- blocking writes (run outside a transaction block).
+-- Keep the INCLUDE list in sync with FEATURE_DEFAULTS.
+-- ============================================================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_features_id_drift
+    ON transaction_features(id)
+    INCLUDE (
+        amount,
+        amount_zscore,
+        user_avg_amount_30d,
+        user_txn_count_1h,
+        user_txn_count_24h,
+        user_txn_count_7d,
+        user_amount_sum_1h,
+        user_amount_sum_24h,
+        country_change_flag,
+        device_change_flag,
+        unique_countries_24h,
+        unique_merchants_24h,
+        user_merchant_first_time,
+        hour_of_day,
+        day_of_week,
+        is_weekend,
+        is_night,
+        minutes_since_last_txn,
+        channel_encoded,
+        label
+    );
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_features_txn_id_drift;
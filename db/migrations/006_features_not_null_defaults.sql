@@ -0,0 +1,92 @@
+-- ============================================================================
+-- transaction_features: defaults + NOT NULL for always-computed features
+-- ============================================================================
+-- The feature consumer computes these columns for every transaction, so
+-- NULL never carries meaning for them. Declaring that in the schema lets
+-- readers (the drift detector in particular) use the values as-is,
+-- without per-row COALESCE or client-side NULL handling.
+--
+-- Columns where NULL is meaningful are left nullable:
+--   amount_zscore, user_avg_amount_30d, user_std_amount_30d  (no history)
+--   minutes_since_last_txn                                    (first txn)
+--   is_foreign_txn                                            (no home country)
+--   label                                                     (unlabelled)
+--
+-- The defaults match FEATURE_DEFAULTS in
+-- services/drift_detector/reference_data.py.
+--
+-- SET NOT NULL scans the table under an ACCESS EXCLUSIVE lock; on a large
+-- live table run this in a quiet period.
+-- ============================================================================
+
+BEGIN;
+
+UPDATE transaction_features SET
+    user_txn_count_1h        = COALESCE(user_txn_count_1h, 0),
+    user_txn_count_24h       = COALESCE(user_txn_count_24h, 0),
+    user_txn_count_7d        = COALESCE(user_txn_count_7d, 0),
+    user_amount_sum_1h       = COALESCE(user_amount_sum_1h, 0),
+    user_amount_sum_24h      = COALESCE(user_amount_sum_24h, 0),
+    country_change_flag      = COALESCE(country_change_flag, false),
+    device_change_flag       = COALESCE(device_change_flag, false),
+    unique_countries_24h     = COALESCE(unique_countries_24h, 1),
+    unique_merchants_24h     = COALESCE(unique_merchants_24h, 1),
+    unique_devices_24h       = COALESCE(unique_devices_24h, 0),
+    user_merchant_first_time = COALESCE(user_merchant_first_time, false),
+    hour_of_day              = COALESCE(hour_of_day, 12),
+    day_of_week              = COALESCE(day_of_week, 0),
+    is_weekend               = COALESCE(is_weekend, false),
+    is_night                 = COALESCE(is_night, false),
+    channel_encoded          = COALESCE(channel_encoded, 0)
+WHERE user_txn_count_1h IS NULL
+   OR user_txn_count_24h IS NULL
+   OR user_txn_count_7d IS NULL
+   OR user_amount_sum_1h IS NULL
+   OR user_amount_sum_24h IS NULL
+   OR country_change_flag IS NULL
+   OR device_change_flag IS NULL
+   OR unique_countries_24h IS NULL
+   OR unique_merchants_24h IS NULL
+   OR unique_devices_24h IS NULL
+   OR user_merchant_first_time IS NULL
+   OR hour_of_day IS NULL
+   OR day_of_week IS NULL
+   OR is_weekend IS NULL
+   OR is_night IS NULL
+   OR channel_encoded IS NULL;
+
+ALTER TABLE transaction_features
+    ALTER COLUMN user_txn_count_1h        SET DEFAULT 0,
+    ALTER COLUMN user_txn_count_1h        SET NOT NULL,
+    ALTER COLUMN user_txn_count_24h       SET DEFAULT 0,
+    ALTER COLUMN user_txn_count_24h       SET NOT NULL,
+    ALTER COLUMN user_txn_count_7d        SET DEFAULT 0,
+    ALTER COLUMN user_txn_count_7d        SET NOT NULL,
+    ALTER COLUMN user_amount_sum_1h       SET DEFAULT 0,
+    ALTER COLUMN user_amount_sum_1h       SET NOT NULL,
+    ALTER COLUMN user_amount_sum_24h      SET DEFAULT 0,
+    ALTER COLUMN user_amount_sum_24h      SET NOT NULL,
+    ALTER COLUMN country_change_flag      SET DEFAULT false,
+    ALTER COLUMN country_change_flag      SET NOT NULL,
+    ALTER COLUMN device_change_flag       SET DEFAULT false,
+    ALTER COLUMN device_change_flag       SET NOT NULL,
+    ALTER COLUMN unique_countries_24h     SET DEFAULT 1,
+    ALTER COLUMN unique_countries_24h     SET NOT NULL,
+    ALTER COLUMN unique_merchants_24h     SET DEFAULT 1,
+    ALTER COLUMN unique_merchants_24h     SET NOT NULL,
+    ALTER COLUMN unique_devices_24h       SET DEFAULT 0,
+    ALTER COLUMN unique_devices_24h       SET NOT NULL,
+    ALTER COLUMN user_merchant_first_time SET DEFAULT false,
+    ALTER COLUMN user_merchant_first_time SET NOT NULL,
+    ALTER COLUMN hour_of_day              SET DEFAULT 12,
+    ALTER COLUMN hour_of_day              SET NOT NULL,
+    ALTER COLUMN day_of_week              SET DEFAULT 0,
+    ALTER COLUMN day_of_week              SET NOT NULL,
+    ALTER COLUMN is_weekend               SET DEFAULT false,
+    ALTER COLUMN is_weekend               SET NOT NULL,
+    ALTER COLUMN is_night                 SET DEFAULT false,
+    ALTER COLUMN is_night                 SET NOT NULL,
+    ALTER COLUMN channel_encoded          SET DEFAULT 0,
+    ALTER COLUMN channel_encoded          SET NOT NULL;
+
+COMMIT;
@@ -0,0 +1,24 @@
+-- ============================================================================
+-- Alerts: Feature Containment and Recency Indexes
+-- ============================================================================
+-- GET /alerts and /alerts/stats can be narrowed to alerts whose top
+-- features include a given feature (?feature=amount_zscore), which the
+-- model service queries as
+--
+--     top_features @> '[{"feature": "amount_zscore"}]'
+--
+-- jsonb_path_ops only supports containment (@>, @?, @@), which is all we
+-- use, and the index is about half the size of the default jsonb_ops.
+--
+-- The unfiltered recent-alerts list orders every alert by created_at;
+-- idx_alerts_unresolved only covers unresolved ones.
+--
+-- CONCURRENTLY so it can also be applied to a live database without
+-- blocking writes (run outside a transaction block).
+-- ============================================================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_alerts_top_features
+    ON alerts USING gin (top_features jsonb_path_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_alerts_created_at
+    ON alerts(created_at DESC);
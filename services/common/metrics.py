@@ -14,6 +14,12 @@ Usage:
     SCORING_REQUESTS.inc()
 """
 
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Tuple
+
 from prometheus_client import (
     Counter,
     Gauge,
@@ -25,8 +31,13 @@ from prometheus_client import (
     CollectorRegistry,
     multiprocess,
     REGISTRY,
+    disable_created_metrics,
 )
 
+# Skip the per-child *_created samples; nothing consumes them and they add
+# a line per counter/histogram child to every scrape
+disable_created_metrics()
+
 # =============================================================================
 # PRODUCER METRICS
 # =============================================================================
@@ -43,10 +54,9 @@ PRODUCER_ERRORS = Counter(
     ['error_type']
 )
 
-PRODUCER_LATENCY = Histogram(
+PRODUCER_LATENCY = Summary(
     'fraud_producer_send_latency_seconds',
-    'Time to send message to Kafka',
-    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+    'Time to send message to Kafka'
 )
 
 # =============================================================================
@@ -65,24 +75,26 @@ FEATURE_CONSUMER_MESSAGES = Counter(
     ['status']
 )
 
+# Per-partition lag multiplies series with every partition added to the
+# topic, so it is opt-in. By default lag is summed per consumer group.
+PARTITION_LAG_LABELS = os.getenv("METRICS_PARTITION_LABELS", "false").lower() == "true"
+
 CONSUMER_LAG = Gauge(
     'fraud_consumer_lag',
     'Consumer lag (messages behind)',
-    ['consumer_group', 'partition']
+    ['consumer_group', 'partition'] if PARTITION_LAG_LABELS else ['consumer_group']
 )
 
-CONSUMER_PROCESSING_TIME = Histogram(
+CONSUMER_PROCESSING_TIME = Summary(
     'fraud_consumer_processing_seconds',
     'Time to process a single message',
-    ['consumer_type'],
-    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+    ['consumer_type']
 )
 
-DB_WRITE_LATENCY = Histogram(
+DB_WRITE_LATENCY = Summary(
     'fraud_db_write_latency_seconds',
     'Database write latency',
-    ['table'],
-    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+    ['table']
 )
 
 # =============================================================================
@@ -104,7 +116,7 @@ SCORING_DECISIONS = Counter(
 SCORING_LATENCY = Histogram(
     'fraud_scoring_latency_seconds',
     'End-to-end scoring latency',
-    buckets=[0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0]
+    buckets=[0.01, 0.05, 0.1, 0.25, 1.0]
 )
 
 ALERTS_CREATED = Counter(
@@ -139,21 +151,66 @@ SCORE_MAX = Gauge(
 # =============================================================================
 
 class RollingScoreTracker:
-    """Track rolling statistics of fraud scores."""
+    """
+    Track rolling statistics of fraud scores.
     
-    def __init__(self, window_size: int = 100):
+    State is guarded by a single lock so concurrent scorers can share one
+    tracker. The gauges are only refreshed every `flush_every` scores to
+    keep Prometheus writes off most scoring calls.
+    """
+    
+    def __init__(self, window_size: int = 100, flush_every: int = 16):
         self.window_size = window_size
-        self.scores: list = []
+        self.flush_every = flush_every
+        self.scores: Deque[float] = deque(maxlen=window_size)
+        self._sum: float = 0.0
+        # (index, score) pairs with strictly decreasing scores; the head
+        # is always the max of the current window
+        self._max_dq: Deque[Tuple[int, float]] = deque()
+        self._idx: int = 0
+        self._since_flush: int = 0
+        self._lock = threading.Lock()
     
     def add(self, score: float):
-        self.scores.append(score)
-        if len(self.scores) > self.window_size:
-            self.scores.pop(0)
+        with self._lock:
+            # deque drops the oldest score on append once full, so take it
+            # out of the running sum first
+            if len(self.scores) == self.window_size:
+                self._sum -= self.scores[0]
+            self.scores.append(score)
+            self._sum += score
+            
+            # Monotonic deque: drop smaller scores that can never be the max
+            # again, then expire the head once it falls out of the window
+            while self._max_dq and self._max_dq[-1][1] <= score:
+                self._max_dq.pop()
+            self._max_dq.append((self._idx, score))
+            if self._max_dq[0][0] <= self._idx - self.window_size:
+                self._max_dq.popleft()
+            self._idx += 1
+            
+            self._since_flush += 1
+            if self._since_flush < self.flush_every:
+                return
+            self._since_flush = 0
+            mean = self._sum / len(self.scores)
+            max_score = self._max_dq[0][1]
         
         # Update gauges
-        if self.scores:
-            SCORE_MEAN.set(sum(self.scores) / len(self.scores))
-            SCORE_MAX.set(max(self.scores))
+        SCORE_MEAN.set(mean)
+        SCORE_MAX.set(max_score)
+    
+    def flush(self):
+        """Push the current window statistics to the gauges immediately."""
+        with self._lock:
+            if not self.scores:
+                return
+            self._since_flush = 0
+            mean = self._sum / len(self.scores)
+            max_score = self._max_dq[0][1]
+        
+        SCORE_MEAN.set(mean)
+        SCORE_MAX.set(max_score)
 
 score_tracker = RollingScoreTracker()
 
@@ -162,9 +219,22 @@ score_tracker = RollingScoreTracker()
 # UTILITY FUNCTIONS
 # =============================================================================
 
+# Serialized /metrics output is reused for this long, so concurrent or
+# back-to-back scrapes share a single generate_latest() call
+METRICS_CACHE_TTL_SECONDS = 1.0
+
+_metrics_cache = {"ts": 0.0, "body": b""}
+_metrics_cache_lock = threading.Lock()
+
+
 def get_metrics():
-    """Generate Prometheus metrics output."""
-    return generate_latest(REGISTRY)
+    """Generate Prometheus metrics output (cached for METRICS_CACHE_TTL_SECONDS)."""
+    with _metrics_cache_lock:
+        now = time.monotonic()
+        if now - _metrics_cache["ts"] >= METRICS_CACHE_TTL_SECONDS:
+            _metrics_cache["body"] = generate_latest(REGISTRY)
+            _metrics_cache["ts"] = now
+        return _metrics_cache["body"]
 
 def get_content_type():
     """Get the content type for Prometheus metrics."""
@@ -30,31 +30,44 @@ HOW TO USE:
 ==========================================
 """
 
+import asyncio
+import glob
 import logging
 import sys
 import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 from contextlib import asynccontextmanager
-from threading import Thread
+from threading import Lock
 
 from fastapi import FastAPI, Response, HTTPException
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from prometheus_client import (
     Counter, Gauge, Histogram, Info,
-    generate_latest, CONTENT_TYPE_LATEST,
+    REGISTRY, generate_latest, CONTENT_TYPE_LATEST,
     start_http_server,
+    disable_created_metrics,
 )
-from apscheduler.schedulers.background import BackgroundScheduler
+from prometheus_client.core import GaugeMetricFamily
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from config import config
 from reference_data import (
     load_reference_and_current,
     get_data_stats,
+    close_pool,
 )
 from drift_checks import (
     run_drift_check,
+    save_html_report,
     DriftCheckResult,
+    FeatureColumns,
+    HTML_REPORT_AVAILABLE,
+    num_rows,
     calculate_simple_drift_metrics,
 )
 
@@ -70,6 +83,10 @@ logging.basicConfig(
 log = logging.getLogger("drift_detector")
 
 
+# Skip the per-child *_created samples; nothing consumes them and they add
+# a line per counter/histogram child to every scrape
+disable_created_metrics()
+
 # ============================================================================
 # PROMETHEUS METRICS
 # ============================================================================
@@ -95,26 +112,6 @@ DRIFT_FEATURES_DRIFTED = Gauge(
     'Number of features with detected drift'
 )
 
-# Per-feature drift scores
-DRIFT_SCORE = Gauge(
-    'fraud_drift_score',
-    'Drift score (p-value) for each feature',
-    ['feature']
-)
-
-FEATURE_DRIFT_DETECTED = Gauge(
-    'fraud_feature_drift_detected',
-    'Whether drift is detected for specific feature (1=yes, 0=no)',
-    ['feature']
-)
-
-# Feature statistics
-FEATURE_MEAN = Gauge(
-    'fraud_feature_mean',
-    'Mean value of feature',
-    ['feature', 'dataset']  # dataset = 'reference' or 'current'
-)
-
 # Drift check execution
 DRIFT_CHECK_DURATION = Histogram(
     'fraud_drift_check_duration_seconds',
@@ -148,6 +145,75 @@ DATA_CURRENT_ROWS = Gauge(
     'Number of rows in current dataset'
 )
 
+class DriftCollector:
+    """
+    Exports the per-feature gauges straight from the latest DriftCheckResult.
+    
+    update_metrics only swaps in the new result via update(); the metric
+    families are built in one pass at scrape time instead of through a
+    .labels().set() call per feature and series. Features that drop out of a result simply
+    stop being exported.
+    """
+    
+    def __init__(self):
+        self._last: Optional[DriftCheckResult] = None
+    
+    def update(self, result: DriftCheckResult) -> None:
+        """Export the per-feature series of `result` from the next scrape on."""
+        self._last = result
+    
+    def describe(self):
+        return self._families()
+    
+    def collect(self):
+        result = self._last
+        if result is None:
+            return self._families()
+        
+        drift_score, feature_drift, feature_mean = families = self._families()
+        # Restricted to the configured whitelist so ad-hoc feature lists
+        # can't add new label values
+        monitored = config.drift.monitored_feature_set
+        
+        for fr in result.feature_results:
+            name = fr.feature_name
+            if name not in monitored:
+                continue
+            drift_score.add_metric([name], fr.drift_score)
+            feature_drift.add_metric([name], 1 if fr.drift_detected else 0)
+            if fr.reference_mean is not None:
+                feature_mean.add_metric([name, 'reference'], fr.reference_mean)
+            if fr.current_mean is not None:
+                feature_mean.add_metric([name, 'current'], fr.current_mean)
+        
+        return families
+    
+    @staticmethod
+    def _families() -> List[GaugeMetricFamily]:
+        return [
+            # Per-feature drift scores
+            GaugeMetricFamily(
+                'fraud_drift_score',
+                'Drift score (p-value) for each feature',
+                labels=['feature'],
+            ),
+            GaugeMetricFamily(
+                'fraud_feature_drift_detected',
+                'Whether drift is detected for specific feature (1=yes, 0=no)',
+                labels=['feature'],
+            ),
+            # Feature statistics
+            GaugeMetricFamily(
+                'fraud_feature_mean',
+                'Mean value of feature',
+                labels=['feature', 'dataset'],  # dataset = 'reference' or 'current'
+            ),
+        ]
+
+
+DRIFT_COLLECTOR = DriftCollector()
+REGISTRY.register(DRIFT_COLLECTOR)
+
 
 # ============================================================================
 # GLOBAL STATE
@@ -155,20 +221,40 @@ DATA_CURRENT_ROWS = Gauge(
 
 # Store the latest drift check result
 latest_result: Optional[DriftCheckResult] = None
-scheduler: Optional[BackgroundScheduler] = None
+# (reference, current) feature arrays the latest result was computed
+# from, kept so the HTML report can be rendered on demand
+latest_data: Optional[Tuple[FeatureColumns, FeatureColumns]] = None
+scheduler: Optional[AsyncIOScheduler] = None
+# Single worker thread for the drift statistics. The SciPy/NumPy kernels
+# release the GIL, and a thread (unlike a forked process) neither
+# inherits this process's locks and DB sockets nor needs the feature
+# windows pickled across on every check.
+drift_executor: Optional[ThreadPoolExecutor] = None
+# HTML reports are rendered here, off the drift check path; futures are
+# kept by report path so /drift/report can tell when one is ready
+report_executor: Optional[ThreadPoolExecutor] = None
+report_futures: Dict[str, Future] = {}
+
+# Serialized /metrics output, reused for METRICS_CACHE_TTL_SECONDS so
+# concurrent scrapes share one generate_latest() call
+METRICS_CACHE_TTL_SECONDS = 1.0
+_metrics_cache = {"ts": 0.0, "body": b""}
+_metrics_cache_lock = Lock()
 
 
 # ============================================================================
 # DRIFT CHECK LOGIC
 # ============================================================================
 
-def run_scheduled_drift_check():
+async def run_scheduled_drift_check():
     """
     Run a drift check and update metrics.
     
-    Called periodically by the scheduler.
+    Called periodically by the scheduler. Everything blocking is kept off
+    the event loop: data loading runs in the default thread pool and the
+    CPU-heavy statistics run in the dedicated drift worker thread.
     """
-    global latest_result
+    global latest_result, latest_data
     
     log.info("=" * 60)
     log.info("RUNNING SCHEDULED DRIFT CHECK")
@@ -176,31 +262,37 @@ def run_scheduled_drift_check():
     
     DRIFT_CHECKS_RUN.inc()
     start_time = datetime.now()
+    loop = asyncio.get_running_loop()
     
     try:
         # Load data
-        reference_df, current_df = load_reference_and_current()
+        reference, current = await loop.run_in_executor(
+            None, load_reference_and_current
+        )
         
-        if reference_df is None or current_df is None:
+        if reference is None or current is None:
             log.warning("Not enough data for drift check")
             DRIFT_CHECK_ERRORS.inc()
             return
         
         # Update data size metrics
-        DATA_REFERENCE_ROWS.set(len(reference_df))
-        DATA_CURRENT_ROWS.set(len(current_df))
+        DATA_REFERENCE_ROWS.set(num_rows(reference))
+        DATA_CURRENT_ROWS.set(num_rows(current))
         
-        # Run drift check
-        report_path = f"/tmp/drift_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
-        result = run_drift_check(
-            reference_df,
-            current_df,
-            generate_report=True,
-            report_path=report_path,
+        # Run drift check. The HTML report is never rendered inline: if
+        # opted in it is queued below, otherwise /drift/report renders it
+        # lazily from the data snapshot.
+        result = await loop.run_in_executor(
+            drift_executor,
+            partial(run_drift_check, reference, current, generate_report=False),
         )
         
+        if config.drift.generate_report:
+            result.html_report_path, _ = schedule_report(reference, current)
+        
         # Store result
         latest_result = result
+        latest_data = (reference, current)
         
         # Update Prometheus metrics
         update_metrics(result)
@@ -227,6 +319,49 @@ def run_scheduled_drift_check():
         DRIFT_CHECK_ERRORS.inc()
 
 
+REPORT_GLOB = "/tmp/drift_report_*.html"
+# /tmp is usually tmpfs (RAM), so only the newest reports are kept
+MAX_REPORTS_KEPT = 10
+
+
+def new_report_path() -> str:
+    """Timestamped location for a drift HTML report."""
+    return f"/tmp/drift_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
+
+
+def schedule_report(reference: FeatureColumns, current: FeatureColumns) -> Tuple[str, Future]:
+    """
+    Queue an HTML report render on the report thread.
+    
+    Returns the target path straight away, plus the future resolving to
+    the path (or None if rendering failed). Old reports are pruned once
+    the new one is written.
+    """
+    report_path = new_report_path()
+    future = report_executor.submit(save_html_report, reference, current, report_path)
+    future.add_done_callback(lambda _: prune_old_reports())
+    
+    # Keep futures only for renders that are pending or the latest one
+    for path in [p for p, f in report_futures.items() if f.done()]:
+        del report_futures[path]
+    report_futures[report_path] = future
+    
+    return report_path, future
+
+
+def prune_old_reports(keep: int = MAX_REPORTS_KEPT):
+    """Delete all but the `keep` most recently modified drift reports."""
+    try:
+        reports = sorted(glob.glob(REPORT_GLOB), key=os.path.getmtime, reverse=True)
+        for path in reports[keep:]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+    except Exception as e:
+        log.warning(f"Failed to prune old drift reports: {e}")
+
+
 def update_metrics(result: DriftCheckResult):
     """Update Prometheus metrics from drift check result."""
     
@@ -236,26 +371,8 @@ def update_metrics(result: DriftCheckResult):
     DRIFT_FEATURES_TOTAL.set(result.num_features_checked)
     DRIFT_FEATURES_DRIFTED.set(result.num_features_drifted)
     
-    # Per-feature metrics
-    for feature_result in result.feature_results:
-        DRIFT_SCORE.labels(feature=feature_result.feature_name).set(
-            feature_result.drift_score
-        )
-        FEATURE_DRIFT_DETECTED.labels(feature=feature_result.feature_name).set(
-            1 if feature_result.drift_detected else 0
-        )
-        
-        if feature_result.reference_mean is not None:
-            FEATURE_MEAN.labels(
-                feature=feature_result.feature_name,
-                dataset='reference'
-            ).set(feature_result.reference_mean)
-        
-        if feature_result.current_mean is not None:
-            FEATURE_MEAN.labels(
-                feature=feature_result.feature_name,
-                dataset='current'
-            ).set(feature_result.current_mean)
+    # Per-feature series are rendered by the collector at scrape time
+    DRIFT_COLLECTOR.update(result)
 
 
 # ============================================================================
@@ -265,7 +382,7 @@ def update_metrics(result: DriftCheckResult):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown logic."""
-    global scheduler
+    global scheduler, drift_executor, report_executor
     
     log.info("=" * 60)
     log.info("STARTING DRIFT DETECTOR SERVICE")
@@ -279,8 +396,12 @@ async def lifespan(app: FastAPI):
     log.info(f"Starting metrics server on port {config.server.metrics_port}")
     start_http_server(config.server.metrics_port)
     
-    # Start scheduler for periodic drift checks
-    scheduler = BackgroundScheduler()
+    # Worker thread for drift computations
+    drift_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="drift-check")
+    report_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="drift-report")
+    
+    # Start scheduler for periodic drift checks (runs on this event loop)
+    scheduler = AsyncIOScheduler()
     scheduler.add_job(
         run_scheduled_drift_check,
         'interval',
@@ -298,6 +419,11 @@ async def lifespan(app: FastAPI):
     log.info("Shutting down drift detector...")
     if scheduler:
         scheduler.shutdown()
+    if drift_executor:
+        drift_executor.shutdown(cancel_futures=True)
+    if report_executor:
+        report_executor.shutdown(cancel_futures=True)
+    close_pool()
 
 
 app = FastAPI(
@@ -342,24 +468,33 @@ async def get_drift_status():
     }
 
 
-@app.get("/drift/run")
+@app.get("/drift/run", status_code=202)
 async def run_manual_drift_check():
     """
     Trigger a manual drift check.
     
     Use this for immediate checks instead of waiting for scheduled check.
+    The check runs in the background; poll /drift/status for the result.
     """
     log.info("Manual drift check triggered via API")
     
-    # Run in current thread (blocking)
-    run_scheduled_drift_check()
+    if scheduler is None:
+        raise HTTPException(status_code=503, detail="Scheduler not running")
     
-    if latest_result is None:
-        raise HTTPException(status_code=500, detail="Drift check failed")
+    # Hand off to the scheduler so the request returns at once
+    scheduler.add_job(
+        run_scheduled_drift_check,
+        'date',
+        run_date=datetime.now(),
+        id='manual_drift_check',
+        name='Manual Drift Check',
+        replace_existing=True,
+    )
     
     return {
-        "status": "completed",
-        "result": latest_result.to_dict(),
+        "status": "scheduled",
+        "job_id": "manual_drift_check",
+        "last_check": latest_result.timestamp.isoformat() if latest_result else None,
     }
 
 
@@ -368,22 +503,51 @@ async def get_drift_report():
     """
     Download the latest HTML drift report.
     
-    Returns a detailed Evidently report with visualizations.
+    Returns a detailed Evidently report with visualizations. The report is
+    rendered on first request for each drift check (or queued right after
+    the check with DRIFT_GENERATE_REPORT) and reused afterwards. Returns
+    202 while a queued report is still rendering.
     """
-    if latest_result is None or latest_result.html_report_path is None:
+    if latest_result is None:
         raise HTTPException(
             status_code=404,
             detail="No drift report available. Run a drift check first."
         )
     
-    if not os.path.exists(latest_result.html_report_path):
+    if not HTML_REPORT_AVAILABLE:
         raise HTTPException(
-            status_code=404,
-            detail="Report file not found"
+            status_code=501,
+            detail="HTML reports need Evidently (requirements-report.txt)"
+        )
+    
+    result = latest_result
+    report_path = result.html_report_path
+    
+    # Report queued after the check but not written yet: poll again later
+    future = report_futures.get(report_path) if report_path else None
+    if future is not None and not future.done():
+        return JSONResponse(
+            status_code=202,
+            content={"status": "rendering", "last_check": result.timestamp.isoformat()},
         )
     
+    if report_path is None or not os.path.exists(report_path):
+        if latest_data is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Report file not found"
+            )
+        reference, current = latest_data
+        report_path, future = schedule_report(reference, current)
+        result.html_report_path = report_path
+        if await asyncio.wrap_future(future) is None:
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to render drift report"
+            )
+    
     return FileResponse(
-        latest_result.html_report_path,
+        report_path,
         media_type="text/html",
         filename="drift_report.html"
     )
@@ -396,7 +560,7 @@ async def get_stats():
     
     Shows how much data is available for drift detection.
     """
-    stats = get_data_stats()
+    stats = await run_in_threadpool(get_data_stats)
     return {
         "data_stats": stats,
         "config": {
@@ -416,16 +580,18 @@ async def get_simple_drift():
     
     Useful for quick checks or debugging.
     """
-    reference_df, current_df = load_reference_and_current()
+    reference, current = await run_in_threadpool(load_reference_and_current)
     
-    if reference_df is None or current_df is None:
+    if reference is None or current is None:
         return {"status": "insufficient_data"}
     
-    metrics = calculate_simple_drift_metrics(reference_df, current_df)
+    metrics = await run_in_threadpool(
+        calculate_simple_drift_metrics, reference, current
+    )
     return {
         "status": "ok",
-        "reference_rows": len(reference_df),
-        "current_rows": len(current_df),
+        "reference_rows": num_rows(reference),
+        "current_rows": num_rows(current),
         "features": metrics,
     }
 
@@ -433,8 +599,15 @@ async def get_simple_drift():
 @app.get("/metrics")
 async def metrics():
     """Prometheus metrics endpoint."""
+    with _metrics_cache_lock:
+        now = time.monotonic()
+        if now - _metrics_cache["ts"] >= METRICS_CACHE_TTL_SECONDS:
+            _metrics_cache["body"] = generate_latest()
+            _metrics_cache["ts"] = now
+        body = _metrics_cache["body"]
+    
     return Response(
-        content=generate_latest(),
+        content=body,
         media_type=CONTENT_TYPE_LATEST
     )
 
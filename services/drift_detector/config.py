@@ -7,7 +7,8 @@ All settings can be overridden via environment variables.
 """
 
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import FrozenSet, Tuple
 
 
 @dataclass
@@ -19,6 +20,16 @@ class DatabaseConfig:
     user: str = os.getenv("PGUSER", "fraud")
     password: str = os.getenv("PGPASSWORD", "fraud")
     
+    # Read drift windows through the ADBC Postgres driver (Arrow columnar
+    # batches) instead of psycopg2 rows. Needs adbc-driver-postgresql and
+    # pyarrow; falls back to psycopg2 when they aren't installed.
+    use_adbc: bool = os.getenv("DRIFT_USE_ADBC", "false").lower() == "true"
+    
+    # Bounds of the shared psycopg2 connection pool (drift checks, the
+    # stats endpoint and on-demand loads borrow from it concurrently)
+    pool_min_conn: int = int(os.getenv("DRIFT_DB_POOL_MIN", "1"))
+    pool_max_conn: int = int(os.getenv("DRIFT_DB_POOL_MAX", "4"))
+    
     @property
     def connection_string(self) -> str:
         return f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
@@ -44,16 +55,29 @@ class DriftConfig:
     # Lower = more sensitive
     drift_threshold: float = float(os.getenv("DRIFT_THRESHOLD", "0.05"))
     
-    # Features to monitor for drift
-    monitored_features: list = None
+    # Queue the Evidently HTML report (rendered in the background) after
+    # every check. Off by default: the report is built on demand by
+    # GET /drift/report instead.
+    generate_report: bool = os.getenv("DRIFT_GENERATE_REPORT", "false").lower() == "true"
+    
+    # Features to monitor for drift (frozen; the set form is for fast
+    # membership tests when filtering per-feature metrics)
+    monitored_features: Tuple[str, ...] = None
+    monitored_feature_set: FrozenSet[str] = field(default=None, init=False)
+    
+    # Upper bound on monitored features. Every feature adds several
+    # labelled series to /metrics, so keep the whitelist small.
+    max_monitored_features: int = int(os.getenv("DRIFT_MAX_MONITORED_FEATURES", "64"))
     
     def __post_init__(self):
         features_str = os.getenv("DRIFT_MONITORED_FEATURES", "")
         if features_str:
-            self.monitored_features = [f.strip() for f in features_str.split(",")]
+            self.monitored_features = tuple(
+                f.strip() for f in features_str.split(",") if f.strip()
+            )
         else:
             # Default features to monitor
-            self.monitored_features = [
+            self.monitored_features = (
                 "amount",
                 "amount_zscore",
                 "user_txn_count_1h",
@@ -64,7 +88,14 @@ class DriftConfig:
                 "unique_merchants_24h",
                 "hour_of_day",
                 "channel_encoded",
-            ]
+            )
+        self.monitored_feature_set = frozenset(self.monitored_features)
+        
+        if len(self.monitored_features) > self.max_monitored_features:
+            raise ValueError(
+                f"DRIFT_MONITORED_FEATURES lists {len(self.monitored_features)} features, "
+                f"max is {self.max_monitored_features} (DRIFT_MAX_MONITORED_FEATURES)"
+            )
 
 
 @dataclass
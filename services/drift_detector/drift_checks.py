@@ -1,8 +1,9 @@
 """
-DRIFT DETECTOR - Drift Checks using Evidently
-==============================================
+DRIFT DETECTOR - Drift Checks
+==============================
 
-Uses Evidently library to detect feature drift and prediction drift.
+Detects feature drift with SciPy statistical tests. Evidently is used only
+to render the optional HTML report.
 
 WHAT IS EVIDENTLY?
 ------------------
@@ -14,14 +15,14 @@ Evidently is an open-source ML monitoring library that can:
 
 HOW DRIFT DETECTION WORKS:
 --------------------------
-For each feature, Evidently runs a statistical test:
+For each feature, a statistical test is run on the raw arrays:
 
 1. For numerical features: Kolmogorov-Smirnov test
    - Compares the cumulative distributions
    - Returns p-value (probability distributions are same)
    - p-value < 0.05 → Drift detected!
 
-2. For categorical features: Chi-squared test
+2. For categorical features (few distinct values): Chi-squared test
    - Compares category frequencies
    - Returns p-value
    - p-value < 0.05 → Drift detected!
@@ -32,27 +33,60 @@ Example:
 - KS test p-value = 0.001 → DRIFT DETECTED!
 """
 
+import importlib.util
 import logging
-from typing import Dict, List, Optional, Any
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Sequence, Tuple, Union
 from datetime import datetime
 from dataclasses import dataclass, field
 
 import pandas as pd
 import numpy as np
-
-from evidently.report import Report
-from evidently.metric_preset import DataDriftPreset, TargetDriftPreset
-from evidently.metrics import (
-    DataDriftTable,
-    DatasetDriftMetric,
-    ColumnDriftMetric,
-    ColumnSummaryMetric,
-)
+from scipy.stats import chi2, chi2_contingency, ks_2samp
 
 from config import config
 
 log = logging.getLogger("drift_detector.checks")
 
+# Drift inputs are struct-of-arrays: one float64 array per feature column.
+# DataFrames are still accepted (features are looked up by name either way)
+# and only built where a library needs one.
+FeatureColumns = Dict[str, np.ndarray]
+FeatureData = Union[FeatureColumns, pd.DataFrame]
+
+# Features with at most this many distinct values are tested as categorical
+CATEGORICAL_MAX_UNIQUE = 8
+
+# Threads for the per-column categorical tests
+DRIFT_TEST_THREADS = os.cpu_count() or 1
+
+# Dataset drift is flagged when at least this share of features drifted
+# (same default as Evidently's DatasetDriftMetric)
+DATASET_DRIFT_SHARE = 0.5
+
+# Evidently is optional and only needed for HTML reports (see
+# requirements-report.txt). Checked without importing it.
+HTML_REPORT_AVAILABLE = importlib.util.find_spec("evidently") is not None
+
+
+def _build_drift_report():
+    """
+    Create an Evidently report with the dataset and per-column drift metrics.
+    
+    Evidently (and the plotting stack it pulls in) is imported here rather
+    than at module level so the service starts without paying for it until
+    the first drift check.
+    """
+    from evidently.report import Report
+    from evidently.metrics import DataDriftTable, DatasetDriftMetric
+    
+    return Report(metrics=[
+        DatasetDriftMetric(),
+        DataDriftTable(),
+    ])
+
 
 @dataclass
 class FeatureDriftResult:
@@ -84,6 +118,14 @@ class DriftCheckResult:
     
     def to_dict(self) -> dict:
         """Convert to dictionary for JSON serialization."""
+        results = self.feature_results
+        # Round each numeric column in one NumPy call
+        drift_scores = np.round(
+            np.fromiter((f.drift_score for f in results), dtype=np.float64, count=len(results)), 6
+        ).tolist()
+        reference_means = _rounded([f.reference_mean for f in results], 4)
+        current_means = _rounded([f.current_mean for f in results], 4)
+        
         return {
             "timestamp": self.timestamp.isoformat(),
             "dataset_drift_detected": self.dataset_drift_detected,
@@ -99,20 +141,28 @@ class DriftCheckResult:
                 {
                     "feature": f.feature_name,
                     "drift_detected": f.drift_detected,
-                    "drift_score": round(f.drift_score, 6),
+                    "drift_score": score,
                     "stattest": f.stattest_name,
-                    "reference_mean": round(f.reference_mean, 4) if f.reference_mean else None,
-                    "current_mean": round(f.current_mean, 4) if f.current_mean else None,
+                    "reference_mean": ref_mean,
+                    "current_mean": cur_mean,
                 }
-                for f in self.feature_results
+                for f, score, ref_mean, cur_mean in zip(
+                    results, drift_scores, reference_means, current_means
+                )
             ],
             "error": self.error,
         }
 
 
+def _rounded(values: List[Optional[float]], decimals: int) -> List[Optional[float]]:
+    """Round optional values with one np.round call; None/0 map to None as before."""
+    arr = np.array([v if v else np.nan for v in values], dtype=np.float64)
+    return [None if v != v else v for v in np.round(arr, decimals).tolist()]
+
+
 def run_drift_check(
-    reference_df: pd.DataFrame,
-    current_df: pd.DataFrame,
+    reference: FeatureData,
+    current: FeatureData,
     features: List[str] = None,
     generate_report: bool = True,
     report_path: str = "/tmp/drift_report.html",
@@ -121,8 +171,8 @@ def run_drift_check(
     Run drift detection comparing reference and current data.
     
     Args:
-        reference_df: Historical/training data (what "normal" looks like)
-        current_df: Recent production data (what's happening now)
+        reference: Historical/training data (what "normal" looks like)
+        current: Recent production data (what's happening now)
         features: List of features to check (default from config)
         generate_report: Whether to generate HTML report
         report_path: Where to save HTML report
@@ -135,10 +185,10 @@ def run_drift_check(
     if features is None:
         features = config.drift.monitored_features
     
-    # Filter to only features that exist in both dataframes
+    # Filter to only features that exist in both datasets
     available_features = [
         f for f in features 
-        if f in reference_df.columns and f in current_df.columns
+        if f in reference and f in current
     ]
     
     if not available_features:
@@ -151,87 +201,115 @@ def run_drift_check(
             error="No features available for drift detection",
         )
     
+    # Callers other than the loaders (tests, ad-hoc frames) may pass
+    # windows too small for the tests to mean anything
+    min_samples = config.drift.min_samples
+    if num_rows(reference) < min_samples or num_rows(current) < min_samples:
+        return DriftCheckResult(
+            timestamp=timestamp,
+            dataset_drift_detected=False,
+            dataset_drift_share=0.0,
+            num_features_checked=0,
+            num_features_drifted=0,
+            reference_rows=num_rows(reference),
+            current_rows=num_rows(current),
+            error="insufficient_samples",
+        )
+    
     log.info(f"Running drift check on {len(available_features)} features")
-    log.info(f"Reference: {len(reference_df)} rows, Current: {len(current_df)} rows")
+    log.info(f"Reference: {num_rows(reference)} rows, Current: {num_rows(current)} rows")
     
-    # Prepare data for Evidently
-    reference_subset = reference_df[available_features].copy()
-    current_subset = current_df[available_features].copy()
+    # Prepare data: (rows, features) float matrices, NaN filled with 0.
+    # The loaders already fill defaults, so the fill is normally a no-op;
+    # otherwise it happens in place.
+    ref_mat = _feature_matrix(reference, available_features)
+    cur_mat = _feature_matrix(current, available_features)
     
-    # Handle any NaN values
-    reference_subset = reference_subset.fillna(0)
-    current_subset = current_subset.fillna(0)
+    threshold = config.drift.drift_threshold
     
     try:
-        # Create Evidently report with drift metrics
-        report = Report(metrics=[
-            DatasetDriftMetric(),
-            DataDriftTable(),
-        ])
+        n_features = len(available_features)
+        drift_scores = np.ones(n_features)
+        stattests = ["K-S p_value"] * n_features
         
-        # Run the report
-        report.run(
-            reference_data=reference_subset,
-            current_data=current_subset,
+        # Columns holding the same single value in both windows can't have
+        # drifted; they keep p=1 and skip the tests entirely
+        ref_min, ref_max = ref_mat.min(axis=0), ref_mat.max(axis=0)
+        constant = (ref_min == ref_max) & (cur_mat.min(axis=0) == cur_mat.max(axis=0)) \
+            & (ref_min == cur_mat[0])
+        
+        # 0/1 flag columns: one vectorized 2x2 chi-squared over all of them
+        binary = ~constant & _is_binary(ref_mat) & _is_binary(cur_mat)
+        if binary.any():
+            drift_scores[binary] = _binary_chi2_pvalues(ref_mat[:, binary], cur_mat[:, binary])
+        
+        for i in np.flatnonzero(constant):
+            stattests[i] = "constant"
+        for i in np.flatnonzero(binary):
+            stattests[i] = "chi-square p_value"
+        
+        # Other low-cardinality columns get a chi-squared test each. The
+        # per-column checks are independent and spend their time in NumPy
+        # sorts, which release the GIL, so they run on a thread pool.
+        remaining = np.flatnonzero(~constant & ~binary).tolist()
+        p_values = _map_columns(
+            lambda i: _categorical_pvalue(ref_mat[:, i], cur_mat[:, i]), remaining
         )
         
-        # Extract results
-        report_dict = report.as_dict()
+        continuous = []
+        for i, p_value in zip(remaining, p_values):
+            if p_value is None:
+                continuous.append(i)
+            else:
+                drift_scores[i] = p_value
+                stattests[i] = "chi-square p_value"
         
-        # Get dataset-level drift
-        dataset_metrics = report_dict["metrics"][0]["result"]
-        dataset_drift = dataset_metrics.get("dataset_drift", False)
-        drift_share = dataset_metrics.get("drift_share", 0.0)
+        # KS for all remaining columns in one vectorized call
+        if continuous:
+            ks = ks_2samp(ref_mat[:, continuous], cur_mat[:, continuous], axis=0, method="asymp")
+            drift_scores[continuous] = ks.pvalue
         
-        # Get per-feature drift
-        drift_table = report_dict["metrics"][1]["result"]
-        drift_by_columns = drift_table.get("drift_by_columns", {})
+        # Distribution stats for every feature at once
+        ref_means, ref_stds = column_mean_std(ref_mat)
+        cur_means, cur_stds = column_mean_std(cur_mat)
         
         feature_results = []
         num_drifted = 0
         
-        for feature_name in available_features:
-            if feature_name in drift_by_columns:
-                col_info = drift_by_columns[feature_name]
-                is_drifted = col_info.get("drift_detected", False)
-                drift_score = col_info.get("drift_score", 1.0)
-                stattest = col_info.get("stattest_name", "unknown")
-                threshold = col_info.get("stattest_threshold", 0.05)
-                
-                # Get distribution stats
-                ref_mean = reference_subset[feature_name].mean()
-                ref_std = reference_subset[feature_name].std()
-                cur_mean = current_subset[feature_name].mean()
-                cur_std = current_subset[feature_name].std()
-                
-                if is_drifted:
-                    num_drifted += 1
-                    log.warning(
-                        f"DRIFT DETECTED: {feature_name} "
-                        f"(score={drift_score:.6f}, ref_mean={ref_mean:.2f}, cur_mean={cur_mean:.2f})"
-                    )
-                
-                feature_results.append(FeatureDriftResult(
-                    feature_name=feature_name,
-                    drift_detected=is_drifted,
-                    drift_score=drift_score,
-                    stattest_name=stattest,
-                    threshold=threshold,
-                    reference_mean=ref_mean,
-                    reference_std=ref_std,
-                    current_mean=cur_mean,
-                    current_std=cur_std,
-                ))
+        for i, feature_name in enumerate(available_features):
+            drift_score = float(drift_scores[i])
+            is_drifted = drift_score < threshold
+            ref_mean = float(ref_means[i])
+            cur_mean = float(cur_means[i])
+            
+            if is_drifted:
+                num_drifted += 1
+                log.warning(
+                    f"DRIFT DETECTED: {feature_name} "
+                    f"(score={drift_score:.6f}, ref_mean={ref_mean:.2f}, cur_mean={cur_mean:.2f})"
+                )
+            
+            feature_results.append(FeatureDriftResult(
+                feature_name=feature_name,
+                drift_detected=is_drifted,
+                drift_score=drift_score,
+                stattest_name=stattests[i],
+                threshold=threshold,
+                reference_mean=ref_mean,
+                reference_std=float(ref_stds[i]),
+                current_mean=cur_mean,
+                current_std=float(cur_stds[i]),
+            ))
+        
+        drift_share = num_drifted / len(available_features)
+        dataset_drift = drift_share >= DATASET_DRIFT_SHARE
         
-        # Generate HTML report if requested
+        # Generate HTML report if requested (Evidently, only on this path)
         html_path = None
         if generate_report:
-            try:
-                report.save_html(report_path)
-                html_path = report_path
-                log.info(f"Saved HTML report to {report_path}")
-            except Exception as e:
-                log.warning(f"Failed to save HTML report: {e}")
+            html_path = save_html_report(
+                reference, current, report_path, available_features
+            )
         
         result = DriftCheckResult(
             timestamp=timestamp,
@@ -240,8 +318,8 @@ def run_drift_check(
             num_features_checked=len(available_features),
             num_features_drifted=num_drifted,
             feature_results=feature_results,
-            reference_rows=len(reference_df),
-            current_rows=len(current_df),
+            reference_rows=num_rows(reference),
+            current_rows=num_rows(current),
             html_report_path=html_path,
         )
         
@@ -260,15 +338,195 @@ def run_drift_check(
             dataset_drift_share=0.0,
             num_features_checked=len(available_features),
             num_features_drifted=0,
-            reference_rows=len(reference_df),
-            current_rows=len(current_df),
+            reference_rows=num_rows(reference),
+            current_rows=num_rows(current),
             error=str(e),
         )
 
 
+def num_rows(data: FeatureData) -> int:
+    """Number of rows in a FeatureColumns dict or DataFrame."""
+    if isinstance(data, pd.DataFrame):
+        return len(data)
+    return len(next(iter(data.values()))) if data else 0
+
+
+def to_columns(rows: np.ndarray, columns: Sequence[str]) -> FeatureColumns:
+    """
+    Split a (rows, features) array into FeatureColumns.
+    
+    The array is laid out column-major first so every column is a
+    contiguous view, not a copy.
+    """
+    rows = np.asfortranarray(rows, dtype=np.float64)
+    return {name: rows[:, i] for i, name in enumerate(columns)}
+
+
+def to_dataframe(data: FeatureData, features: List[str]) -> pd.DataFrame:
+    """DataFrame of `features`, for the edges that need one (HTML report)."""
+    # copy=False: the frame wraps the loaders' arrays instead of copying them
+    return pd.DataFrame({f: data[f] for f in features}, copy=False)
+
+
+def _stack(data: FeatureData, features: List[str]) -> np.ndarray:
+    """
+    (rows, features) float64 matrix of `features`, column-major.
+    
+    Each feature lands in one contiguous column, so the per-feature
+    passes (sorting for KS, histogram binning) scan memory sequentially
+    rather than striding across rows.
+    """
+    mat = np.empty((num_rows(data), len(features)), dtype=np.float64, order="F")
+    for i, f in enumerate(features):
+        mat[:, i] = data[f]
+    return mat
+
+
+def _feature_matrix(data: FeatureData, features: List[str]) -> np.ndarray:
+    """(rows, features) float64 matrix of `features`, with NaN replaced by 0."""
+    mat = _stack(data, features)
+    if np.isnan(mat).any():
+        np.nan_to_num(mat, nan=0.0, copy=False)
+    return mat
+
+
+def column_mean_std(mat: np.ndarray, skipna: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-column mean and sample std (ddof=1) of a (rows, features) matrix.
+    
+    The mean is computed once and reused for the std (np.std would
+    recompute it). With skipna, NaN values are ignored per column.
+    """
+    if skipna:
+        valid = ~np.isnan(mat)
+        n = valid.sum(axis=0)
+        sums = np.where(valid, mat, 0.0).sum(axis=0)
+    else:
+        valid = None
+        n = mat.shape[0]
+        sums = mat.sum(axis=0)
+    
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / n
+        centered = mat - means
+        if valid is not None:
+            centered[~valid] = 0.0
+        stds = np.sqrt(np.einsum("ij,ij->j", centered, centered) / (n - 1))
+    
+    return means, stds
+
+
+def _map_columns(fn, columns: List[int]) -> List[Any]:
+    """Apply fn to each column index, on a thread pool when there are several."""
+    if len(columns) < 2:
+        return [fn(i) for i in columns]
+    with ThreadPoolExecutor(max_workers=min(len(columns), DRIFT_TEST_THREADS)) as pool:
+        return list(pool.map(fn, columns))
+
+
+def _is_binary(mat: np.ndarray) -> np.ndarray:
+    """Per-column mask of columns whose values are all 0 or 1."""
+    return ((mat == 0) | (mat == 1)).all(axis=0)
+
+
+def _binary_chi2_pvalues(ref_mat: np.ndarray, cur_mat: np.ndarray) -> np.ndarray:
+    """
+    Chi-squared p-values for 0/1 columns, all columns at once.
+    
+    Builds a (features, 2, 2) stack of [window x value] contingency tables
+    and applies the same test as chi2_contingency (Yates-corrected, 1 dof).
+    """
+    ref_ones = ref_mat.sum(axis=0)
+    cur_ones = cur_mat.sum(axis=0)
+    observed = np.stack([
+        np.stack([ref_mat.shape[0] - ref_ones, ref_ones], axis=-1),
+        np.stack([cur_mat.shape[0] - cur_ones, cur_ones], axis=-1),
+    ], axis=1)
+    
+    row_totals = observed.sum(axis=2, keepdims=True)
+    col_totals = observed.sum(axis=1, keepdims=True)
+    expected = row_totals * col_totals / observed.sum(axis=(1, 2), keepdims=True)
+    
+    # Yates' continuity correction, as chi2_contingency does for 2x2
+    diff = expected - observed
+    corrected = observed + np.sign(diff) * np.minimum(0.5, np.abs(diff))
+    statistic = ((corrected - expected) ** 2 / expected).sum(axis=(1, 2))
+    
+    return chi2.sf(statistic, 1)
+
+
+def _categorical_pvalue(ref_arr: np.ndarray, cur_arr: np.ndarray) -> Optional[float]:
+    """
+    Chi-squared p-value for a low-cardinality column, None for continuous ones.
+    
+    Flags, encoded categories and hour of day are compared on category
+    counts; columns with more than CATEGORICAL_MAX_UNIQUE distinct values
+    are left to the KS test.
+    """
+    categories, codes = np.unique(np.concatenate([ref_arr, cur_arr]), return_inverse=True)
+    
+    if categories.size <= 1:
+        # Constant in both windows: nothing can have drifted
+        return 1.0
+    
+    if categories.size > CATEGORICAL_MAX_UNIQUE:
+        return None
+    
+    n_ref = ref_arr.size
+    table = np.vstack([
+        np.bincount(codes[:n_ref], minlength=categories.size),
+        np.bincount(codes[n_ref:], minlength=categories.size),
+    ])
+    _, p_value, _, _ = chi2_contingency(table)
+    return float(p_value)
+
+
+def save_html_report(
+    reference: FeatureData,
+    current: FeatureData,
+    report_path: str,
+    features: List[str] = None,
+) -> Optional[str]:
+    """
+    Render the Evidently HTML drift report for a pair of datasets.
+    
+    Kept separate from run_drift_check so scheduled checks don't pay for
+    HTML rendering; the report is built on demand from a data snapshot.
+    
+    Returns:
+        report_path if the report was written, None otherwise
+    """
+    if not HTML_REPORT_AVAILABLE:
+        log.warning("Evidently is not installed; HTML drift reports are disabled")
+        return None
+    
+    if features is None:
+        features = config.drift.monitored_features
+    
+    available_features = [
+        f for f in features
+        if f in reference and f in current
+    ]
+    if not available_features:
+        return None
+    
+    try:
+        report = _build_drift_report()
+        report.run(
+            reference_data=to_dataframe(reference, available_features).fillna(0),
+            current_data=to_dataframe(current, available_features).fillna(0),
+        )
+        report.save_html(report_path)
+        log.info(f"Saved HTML report to {report_path}")
+        return report_path
+    except Exception as e:
+        log.warning(f"Failed to save HTML report: {e}")
+        return None
+
+
 def calculate_simple_drift_metrics(
-    reference_df: pd.DataFrame,
-    current_df: pd.DataFrame,
+    reference: FeatureData,
+    current: FeatureData,
     features: List[str] = None,
 ) -> Dict[str, Dict[str, float]]:
     """
@@ -284,39 +542,58 @@ def calculate_simple_drift_metrics(
     if features is None:
         features = config.drift.monitored_features
     
+    features = [
+        f for f in features
+        if f in reference and f in current
+    ]
+    
+    if not features:
+        return {}
+    
+    # Reference side (matrix, stats, PSI bins) is converted once per
+    # reference window; only the current window is converted per call.
+    # NaN marks missing values and is skipped.
+    ref = reference_summary(reference, features)
+    features = ref.features
+    
+    if not features:
+        return {}
+    
+    cur_mat = _stack(current, features)
     results = {}
     
-    for feature in features:
-        if feature not in reference_df.columns or feature not in current_df.columns:
-            continue
-        
-        ref = reference_df[feature].dropna()
-        cur = current_df[feature].dropna()
-        
-        if len(ref) == 0 or len(cur) == 0:
+    # Features need at least one value on each side
+    cur_has_data = (~np.isnan(cur_mat)).any(axis=0)
+    
+    # Basic statistics
+    ref_means, ref_stds = ref.means, ref.stds
+    cur_means, cur_stds = column_mean_std(cur_mat, skipna=True)
+    
+    # Population Stability Index (PSI)
+    # PSI > 0.1 suggests moderate drift
+    # PSI > 0.25 suggests significant drift
+    try:
+        with ref.lock:
+            ref.hist.reset()
+            ref.hist.update(cur_mat)
+            psis = ref.hist.psi()
+    except Exception:
+        psis = np.zeros(len(features))
+    
+    for i, feature in enumerate(features):
+        if not cur_has_data[i]:
             continue
-        
-        # Basic statistics
-        ref_mean = ref.mean()
-        cur_mean = cur.mean()
-        ref_std = ref.std()
-        cur_std = cur.std()
-        
-        # Population Stability Index (PSI)
-        # PSI > 0.1 suggests moderate drift
-        # PSI > 0.25 suggests significant drift
-        try:
-            psi = calculate_psi(ref, cur)
-        except:
-            psi = 0.0
+        ref_mean = float(ref_means[i])
+        cur_mean = float(cur_means[i])
+        psi = float(psis[i])
         
         results[feature] = {
             "reference_mean": ref_mean,
             "current_mean": cur_mean,
             "mean_diff": cur_mean - ref_mean,
             "mean_diff_pct": (cur_mean - ref_mean) / ref_mean * 100 if ref_mean != 0 else 0,
-            "reference_std": ref_std,
-            "current_std": cur_std,
+            "reference_std": float(ref_stds[i]),
+            "current_std": float(cur_stds[i]),
             "psi": psi,
             "drift_detected": psi > 0.1,
         }
@@ -324,7 +601,7 @@ def calculate_simple_drift_metrics(
     return results
 
 
-def calculate_psi(reference: pd.Series, current: pd.Series, bins: int = 10) -> float:
+def calculate_psi(reference: np.ndarray, current: np.ndarray, bins: int = 10) -> float:
     """
     Calculate Population Stability Index (PSI).
     
@@ -335,21 +612,137 @@ def calculate_psi(reference: pd.Series, current: pd.Series, bins: int = 10) -> f
     
     Formula: PSI = sum((current% - reference%) * ln(current% / reference%))
     """
-    # Create bins based on reference distribution
-    _, bin_edges = np.histogram(reference, bins=bins)
+    ref_arr = np.asarray(reference, dtype=np.float64).reshape(-1, 1)
+    cur_arr = np.asarray(current, dtype=np.float64).reshape(-1, 1)
+    return float(calculate_psi_matrix(ref_arr, cur_arr, bins)[0])
+
+
+def calculate_psi_matrix(reference: np.ndarray, current: np.ndarray, bins: int = 10) -> np.ndarray:
+    """
+    PSI for every column of two (rows, features) matrices at once.
     
-    # Calculate percentages in each bin
-    ref_counts, _ = np.histogram(reference, bins=bin_edges)
-    cur_counts, _ = np.histogram(current, bins=bin_edges)
+    Bin edges are the reference quantiles of each column (equal-mass bins,
+    which hold up better than equal-width ones on skewed amounts). NaN
+    values are ignored.
     
-    ref_pct = ref_counts / len(reference)
-    cur_pct = cur_counts / len(current)
+    Returns:
+        Array with one PSI value per column
+    """
+    hist = ReferenceHistogram(reference, bins)
+    hist.update(current)
+    return hist.psi()
+
+
+class ReferenceHistogram:
+    """
+    PSI against a fixed reference, with the current side counted incrementally.
+    
+    The reference quantile edges and bin percentages are computed once;
+    each update() only bins the new rows into the frozen edges (no sort),
+    and psi() is computed from the running counts on demand. NaN values
+    are ignored.
     
-    # Avoid division by zero
-    ref_pct = np.where(ref_pct == 0, 0.0001, ref_pct)
-    cur_pct = np.where(cur_pct == 0, 0.0001, cur_pct)
+    A value holding more than one bin's worth of the reference (flags,
+    unique_countries_24h, zero-heavy counts) gets a bin of its own, so
+    mostly-constant features still register a shift in the rare values.
+    """
     
-    # Calculate PSI
-    psi = np.sum((cur_pct - ref_pct) * np.log(cur_pct / ref_pct))
+    def __init__(self, reference: np.ndarray, bins: int = 10):
+        self.bins = bins
+        self.n_features = reference.shape[1]
+        
+        # Per-column inner edges, shape (bins - 1, features)
+        quantiles = np.nanquantile(reference, np.linspace(0, 1, bins + 1)[1:-1], axis=0)
+        self.inner = np.column_stack([self._mass_point_edges(q, bins) for q in quantiles.T])
+        
+        ref_counts, ref_n = self._bin_counts(reference)
+        self.ref_pct = self._pct(ref_counts, ref_n)
+        
+        self.counts = np.zeros((self.n_features, bins), dtype=np.int64)
+        self.n = np.zeros(self.n_features, dtype=np.int64)
     
-    return float(psi)
+    def update(self, batch: np.ndarray) -> None:
+        """Add a (rows, features) batch of current data to the running counts."""
+        counts, n = self._bin_counts(batch)
+        self.counts += counts
+        self.n += n
+    
+    def reset(self) -> None:
+        """Forget all current data seen so far."""
+        self.counts[:] = 0
+        self.n[:] = 0
+    
+    def psi(self) -> np.ndarray:
+        """PSI per feature for the current data seen so far."""
+        cur_pct = self._pct(self.counts, self.n)
+        return np.sum((cur_pct - self.ref_pct) * np.log(cur_pct / self.ref_pct), axis=1)
+    
+    def _bin_counts(self, mat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Bin index = number of inner edges <= value; flattened per column
+        # as column * bins + bin so one bincount counts every feature
+        valid = ~np.isnan(mat)
+        bin_idx = (mat[:, None, :] >= self.inner[None, :, :]).sum(axis=1)
+        flat = (bin_idx + np.arange(self.n_features) * self.bins)[valid]
+        counts = np.bincount(flat, minlength=self.n_features * self.bins)
+        return counts.reshape(self.n_features, self.bins), valid.sum(axis=0)
+    
+    @staticmethod
+    def _mass_point_edges(quantiles: np.ndarray, bins: int) -> np.ndarray:
+        # Repeated quantiles mark a point mass e. Binning counts edges <= value,
+        # so with e repeated, e and everything up to the next edge would share
+        # one bin. Keep e once and add the next float above it, which puts
+        # exactly e in its own bin. Each repeat frees at least one slot, so
+        # there are never more than bins - 1 edges; unused slots are +inf
+        # (no finite value reaches them, both sides count 0 there).
+        edges, repeats = np.unique(quantiles, return_counts=True)
+        edges = np.sort(np.concatenate([edges, np.nextafter(edges[repeats > 1], np.inf)]))
+        return np.concatenate([edges, np.full(bins - 1 - edges.size, np.inf)])
+    
+    @staticmethod
+    def _pct(counts: np.ndarray, n: np.ndarray) -> np.ndarray:
+        # Percentages per bin, floored to avoid division by zero
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.maximum(counts / n[:, None], 0.0001)
+
+
+@dataclass
+class ReferenceSummary:
+    """Reference-side inputs of calculate_simple_drift_metrics, computed once."""
+    features: List[str]          # requested features with any reference data
+    means: np.ndarray
+    stds: np.ndarray
+    hist: Optional[ReferenceHistogram]
+    lock: Any = field(default_factory=threading.Lock)
+
+
+# Summary of the last reference seen by calculate_simple_drift_metrics.
+# The loaders hand back the same cached reference arrays until the window
+# changes, so repeated calls skip the conversion, stats and quantile sort.
+_reference_summary: Dict[str, Any] = {"key": None, "reference": None, "summary": None}
+_reference_summary_lock = threading.Lock()
+
+
+def reference_summary(reference: FeatureData, features: List[str], bins: int = 10) -> ReferenceSummary:
+    """ReferenceSummary for `features` of `reference`, reused while it is unchanged."""
+    key = (id(reference), tuple(features), bins)
+    
+    with _reference_summary_lock:
+        cached = _reference_summary
+        if cached["key"] == key and cached["reference"] is reference:
+            return cached["summary"]
+        
+        ref_mat = _stack(reference, features)
+        has_data = (~np.isnan(ref_mat)).any(axis=0)
+        ref_mat = ref_mat[:, has_data]
+        means, stds = column_mean_std(ref_mat, skipna=True)
+        
+        summary = ReferenceSummary(
+            features=[f for f, ok in zip(features, has_data) if ok],
+            means=means,
+            stds=stds,
+            hist=ReferenceHistogram(ref_mat, bins) if has_data.any() else None,
+        )
+        cached["key"] = key
+        cached["reference"] = reference
+        cached["summary"] = summary
+        return summary
@@ -9,260 +9,576 @@ FIXES:
 - v1: Removed created_at column, use transaction_id for ordering
 - v2: Convert Decimal to float for pandas compatibility
 - v3: Fixed Pylance type warnings
+- v4: Stream rows into a float64 buffer (no Decimal/dtype fix-ups needed)
+- v5: Optional Arrow-native loading through ADBC (DRIFT_USE_ADBC)
+- v6: Bulk-read windows with COPY ... TO STDOUT instead of row fetches
+- v7: Return per-feature arrays (struct-of-arrays) instead of DataFrames
+- v8: Build feature arrays column by column (no row-major intermediates)
+- v9: Spool COPY output and parse it in chunks into a preallocated array
+- v10: Window by the id primary key (insertion order) instead of the UUID
+- v11: Load only the monitored features; fill NULL defaults client-side
+- v12: Only nullable columns are NULL-filled (schema defaults, migration 006)
+- v13: Skip the window SELECTs when the table is known to be too small
 """
 
 import logging
-from typing import Optional, Tuple, Dict, Any
-from decimal import Decimal
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Sequence, Tuple, Dict, Any
 
+import numpy as np
 import pandas as pd
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 
 from config import config
+from drift_checks import FeatureColumns, num_rows, to_columns
+
+try:
+    import adbc_driver_postgresql.dbapi as adbc_dbapi
+except ImportError:  # optional, see DatabaseConfig.use_adbc
+    adbc_dbapi = None
 
 log = logging.getLogger("drift_detector.data")
 
+if config.db.use_adbc and adbc_dbapi is None:
+    log.warning("DRIFT_USE_ADBC is set but adbc-driver-postgresql is not installed; using psycopg2")
+
+
+# Shared connection pool, created on first use. Drift checks, the stats
+# endpoint and report rendering borrow from it instead of reconnecting.
+_pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> psycopg2.pool.ThreadedConnectionPool:
+    """Return the shared connection pool, creating it if needed."""
+    global _pool
+    
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = psycopg2.pool.ThreadedConnectionPool(
+                    config.db.pool_min_conn,
+                    config.db.pool_max_conn,
+                    host=config.db.host,
+                    port=config.db.port,
+                    database=config.db.database,
+                    user=config.db.user,
+                    password=config.db.password,
+                )
+    return _pool
+
+
+def close_pool() -> None:
+    """Close every pooled connection (service shutdown)."""
+    global _pool
+    
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
 
-def get_connection():
-    """Create a database connection."""
-    return psycopg2.connect(
-        host=config.db.host,
-        port=config.db.port,
-        database=config.db.database,
-        user=config.db.user,
-        password=config.db.password,
+@contextmanager
+def borrow_conn():
+    """
+    Borrow a pooled connection for the duration of a with-block.
+    
+    The open transaction is rolled back before the connection goes back
+    (the loaders only read); broken connections are discarded.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+# Feature columns available for drift detection, with the value used
+# when a column is NULL. Columns are cast to numbers in SQL (booleans to
+# int) so rows can be read straight into float64 arrays; the NULL
+# defaults are applied client-side by fill_defaults(), one vectorized
+# pass per column instead of a COALESCE per row in Postgres. Covered by
+# the idx_features_id_drift index (migration 005); keep the two in sync.
+FEATURE_DEFAULTS: Dict[str, float] = {
+    "amount": 0.0,
+    "amount_zscore": 0.0,
+    "user_avg_amount_30d": 0.0,
+    "user_txn_count_1h": 0.0,
+    "user_txn_count_24h": 0.0,
+    "user_txn_count_7d": 0.0,
+    "user_amount_sum_1h": 0.0,
+    "user_amount_sum_24h": 0.0,
+    "country_change_flag": 0.0,
+    "device_change_flag": 0.0,
+    "unique_countries_24h": 1.0,
+    "unique_merchants_24h": 1.0,
+    "user_merchant_first_time": 0.0,
+    "hour_of_day": 12.0,
+    "day_of_week": 0.0,
+    "is_weekend": 0.0,
+    "is_night": 0.0,
+    "minutes_since_last_txn": 0.0,
+    "channel_encoded": 0.0,
+    "label": 0.0,
+}
+
+FEATURE_COLUMNS = tuple(FEATURE_DEFAULTS)
+
+# Columns that may hold NULL. The rest are NOT NULL since migration 006,
+# so fill_defaults() doesn't need to scan them.
+NULLABLE_FEATURES = frozenset({
+    "amount_zscore",
+    "user_avg_amount_30d",
+    "minutes_since_last_txn",
+    "label",
+})
+
+BOOL_FEATURES = frozenset({
+    "country_change_flag",
+    "device_change_flag",
+    "user_merchant_first_time",
+    "is_weekend",
+    "is_night",
+    "label",
+})
+
+
+def feature_select(columns: Sequence[str]) -> str:
+    """SELECT list for `columns`, each cast to a number."""
+    return ",\n        ".join(
+        f"{c}::int as {c}" if c in BOOL_FEATURES else f"{c}::double precision as {c}"
+        for c in columns
     )
 
 
-def convert_decimals(df: pd.DataFrame) -> pd.DataFrame:
+def drift_columns() -> Tuple[str, ...]:
+    """
+    Columns the drift checks actually read: the monitored features that
+    exist in transaction_features, in FEATURE_COLUMNS order.
+    """
+    wanted = config.drift.monitored_feature_set
+    return tuple(c for c in FEATURE_COLUMNS if c in wanted)
+
+
+def fill_defaults(data: FeatureColumns) -> FeatureColumns:
+    """Replace NaN (NULL) values in nullable columns with their FEATURE_DEFAULTS value, in place."""
+    for name in NULLABLE_FEATURES.intersection(data):
+        col = data[name]
+        mask = np.isnan(col)
+        if mask.any():
+            np.copyto(col, FEATURE_DEFAULTS[name], where=mask)
+    return data
+
+
+_unknown_features = config.drift.monitored_feature_set - set(FEATURE_COLUMNS)
+if _unknown_features:
+    log.warning(f"Monitored features not in transaction_features, ignored: {sorted(_unknown_features)}")
+
+
+# Single ADBC connection (not thread-safe, so use is serialized)
+_adbc_conn = None
+_adbc_lock = threading.Lock()
+
+
+def fetch_rows_adbc(query: str, params: tuple) -> np.ndarray:
     """
-    Convert all Decimal columns to float.
+    Run a query through ADBC and return its (numeric) rows as a float64 array.
     
-    PostgreSQL returns NUMERIC/DECIMAL as Python Decimal objects,
-    but pandas/numpy need float for calculations.
+    The result arrives as an Arrow table; each column is converted to
+    NumPy directly, with no per-row Python objects.
     """
-    for col in df.columns:
-        if df[col].dtype == object:
-            # Check if first non-null value is Decimal
-            non_null = df[col].dropna()
-            if len(non_null) > 0:
-                first_val = non_null.iloc[0]
-                if isinstance(first_val, Decimal):
-                    df[col] = df[col].astype(float)
-    return df
-
-
-def ensure_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    global _adbc_conn
+    
+    # ADBC's Postgres driver uses $1, $2, ... placeholders
+    parts = query.split("%s")
+    query = parts[0] + "".join(f"${i}{part}" for i, part in enumerate(parts[1:], 1))
+    
+    with _adbc_lock:
+        if _adbc_conn is None:
+            _adbc_conn = adbc_dbapi.connect(config.db.connection_string)
+        try:
+            with _adbc_conn.cursor() as cur:
+                cur.execute(query, params)
+                table = cur.fetch_arrow_table()
+            _adbc_conn.rollback()
+        except Exception:
+            # Drop the connection so the next call reconnects
+            _adbc_conn.close()
+            _adbc_conn = None
+            raise
+    
+    # Filled column by column into a column-major buffer, so each Arrow
+    # column is copied once and to_columns() can take views of the result
+    rows = np.empty((table.num_rows, table.num_columns), dtype=np.float64, order="F")
+    for i, col in enumerate(table.itercolumns()):
+        rows[:, i] = col.to_numpy()
+    return rows
+
+
+# COPY output is spooled in memory up to this size, then to a temp file,
+# and parsed back in chunks of COPY_CHUNK_ROWS into a preallocated array.
+# Peak memory is then the result array plus one chunk, not result + text.
+COPY_SPOOL_BYTES = 32 * 1024 * 1024
+COPY_CHUNK_ROWS = 50_000
+
+
+def fetch_rows(conn, query: str, params: tuple, n_cols: int, max_rows: int) -> np.ndarray:
     """
-    Ensure all columns except transaction_id are numeric.
+    Run a query and return its (numeric) rows as a float64 array.
+    
+    The query is wrapped in COPY ... TO STDOUT (CSV) and the stream is
+    parsed by pandas' C reader, so no per-row Python tuples are built.
+    `max_rows` (the query's LIMIT) sizes the output buffer up front.
+    With DRIFT_USE_ADBC the query goes through ADBC instead and `conn` is
+    not used.
     """
-    for col in df.columns:
-        if col != 'transaction_id':
-            try:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0.0)
-            except Exception:
-                pass
-    return df
+    if config.db.use_adbc and adbc_dbapi is not None:
+        return fetch_rows_adbc(query, params)
+    
+    with tempfile.SpooledTemporaryFile(max_size=COPY_SPOOL_BYTES) as buf:
+        with conn.cursor() as cur:
+            # COPY takes no bind parameters, so they are inlined client-side
+            select_sql = cur.mogrify(query, params).decode()
+            cur.copy_expert(f"COPY ({select_sql}) TO STDOUT WITH (FORMAT csv)", buf)
+        
+        if buf.tell() == 0:
+            return np.empty((0, n_cols), dtype=np.float64)
+        
+        buf.seek(0)
+        rows = np.empty((max_rows, n_cols), dtype=np.float64, order="F")
+        n = 0
+        chunks = pd.read_csv(
+            buf, header=None, dtype=np.float64, engine="c", chunksize=COPY_CHUNK_ROWS
+        )
+        with chunks:
+            for chunk in chunks:
+                rows[n:n + len(chunk)] = chunk.to_numpy()
+                n += len(chunk)
+    
+    return rows[:n]
+
+
+# Windows are taken in insertion order (the id BIGSERIAL primary key;
+# transaction_id is a random UUID and says nothing about age).
+#
+# The reference window is the first N ids, a forward scan that stops
+# after N rows. The current window is a bounded range from the id
+# high-water mark: MAX(id) is a single index probe, and the rows come
+# from a forward range scan instead of a backward scan + LIMIT. Sequence
+# gaps (ids burnt by rolled-back batches) can leave it a few rows short
+# of N, which the drift tests tolerate.
+# Templates: {select} is filled in by feature_select().
+REFERENCE_WINDOW_SQL = """
+    SELECT {select}
+    FROM transaction_features
+    ORDER BY id ASC
+    LIMIT %s
+"""
+
+CURRENT_WINDOW_SQL = """
+    SELECT {select}
+    FROM transaction_features
+    WHERE id > (SELECT MAX(id) FROM transaction_features) - %s
+    ORDER BY id ASC
+    LIMIT %s
+"""
+
+
+def fetch_feature_columns(
+    conn, query: str, params: tuple, limit: int, columns: Sequence[str]
+) -> FeatureColumns:
+    """Run a *_WINDOW_SQL template for `columns` (at most `limit` rows) into per-feature arrays."""
+    query = query.format(select=feature_select(columns))
+    rows = fetch_rows(conn, query, params, len(columns), limit)
+    return fill_defaults(to_columns(rows, columns))
+
+
+def check_window(data: FeatureColumns, window: str) -> Optional[FeatureColumns]:
+    """Return data if it has enough rows for a drift check, else log and return None."""
+    n = num_rows(data)
+    if n == 0:
+        log.warning("No data found in transaction_features")
+        return None
+    
+    min_samples = config.drift.min_samples
+    if n < min_samples:
+        log.warning(
+            f"Not enough {window} data: {n} rows "
+            f"(need {min_samples})"
+        )
+        return None
+    
+    log.info(f"Loaded {n} {window} rows")
+    return data
+
+
+def too_few_rows() -> bool:
+    """
+    True if a still-fresh get_data_stats() result shows fewer than
+    min_samples rows, so no window can pass check_window().
+    
+    Only reads the stats cache (never runs the COUNT(*) itself); the
+    answer may be up to DATA_STATS_TTL_SECONDS old.
+    """
+    with _data_stats_lock:
+        stats = _data_stats_cache["stats"]
+        fresh = time.monotonic() - _data_stats_cache["ts"] < DATA_STATS_TTL_SECONDS
+    if stats is None or not fresh:
+        return False
+    if stats["total_rows"] < config.drift.min_samples:
+        log.warning(
+            f"Not enough data: {stats['total_rows']} rows "
+            f"(need {config.drift.min_samples})"
+        )
+        return True
+    return False
 
 
-def load_reference_data(limit: Optional[int] = None) -> Optional[pd.DataFrame]:
+def load_reference_data(
+    limit: Optional[int] = None, columns: Optional[Sequence[str]] = None
+) -> Optional[FeatureColumns]:
     """
-    Load REFERENCE data (oldest N rows from transaction_features).
+    Load REFERENCE data (first N rows inserted into transaction_features).
     
     This represents the "training distribution" - what the model
     considers normal.
     
     Args:
         limit: Maximum number of rows (default from config)
+        columns: Features to load (default: the monitored ones)
     
     Returns:
-        DataFrame with features, or None if not enough data
+        Per-feature arrays, or None if not enough data
     """
     if limit is None:
         limit = config.drift.reference_window_size
-    
-    # Query only the features we need for drift detection
-    # Use transaction_id for ordering (it's sequential)
-    # Cast NUMERIC to DOUBLE PRECISION to get float instead of Decimal
-    query = """
-    SELECT 
-        transaction_id,
-        amount::double precision as amount,
-        COALESCE(amount_zscore, 0)::double precision as amount_zscore,
-        COALESCE(user_avg_amount_30d, 0)::double precision as user_avg_amount_30d,
-        COALESCE(user_txn_count_1h, 0)::double precision as user_txn_count_1h,
-        COALESCE(user_txn_count_24h, 0)::double precision as user_txn_count_24h,
-        COALESCE(user_txn_count_7d, 0)::double precision as user_txn_count_7d,
-        COALESCE(user_amount_sum_1h, 0)::double precision as user_amount_sum_1h,
-        COALESCE(user_amount_sum_24h, 0)::double precision as user_amount_sum_24h,
-        COALESCE(country_change_flag, false)::int as country_change_flag,
-        COALESCE(device_change_flag, false)::int as device_change_flag,
-        COALESCE(unique_countries_24h, 1)::double precision as unique_countries_24h,
-        COALESCE(unique_merchants_24h, 1)::double precision as unique_merchants_24h,
-        COALESCE(user_merchant_first_time, false)::int as user_merchant_first_time,
-        COALESCE(hour_of_day, 12)::double precision as hour_of_day,
-        COALESCE(day_of_week, 0)::double precision as day_of_week,
-        COALESCE(is_weekend, false)::int as is_weekend,
-        COALESCE(is_night, false)::int as is_night,
-        COALESCE(minutes_since_last_txn, 0)::double precision as minutes_since_last_txn,
-        COALESCE(channel_encoded, 0)::double precision as channel_encoded,
-        COALESCE(label, false)::int as label
-    FROM transaction_features
-    ORDER BY transaction_id ASC
-    LIMIT %s
-    """
+    if columns is None:
+        columns = drift_columns()
+    if too_few_rows():
+        return None
     
     try:
-        conn = get_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(query, (limit,))
-            rows = cur.fetchall()
-        conn.close()
-        
-        if not rows:
-            log.warning("No data found in transaction_features")
-            return None
-        
-        df = pd.DataFrame(rows)
+        with borrow_conn() as conn:
+            data = fetch_feature_columns(conn, REFERENCE_WINDOW_SQL, (limit,), limit, columns)
         
-        # Convert any remaining Decimal to float
-        df = convert_decimals(df)
-        
-        # Ensure numeric types
-        df = ensure_numeric(df)
-        
-        min_samples = config.drift.min_samples
-        if len(df) < min_samples:
-            log.warning(
-                f"Not enough reference data: {len(df)} rows "
-                f"(need {min_samples})"
-            )
-            return None
-        
-        log.info(f"Loaded {len(df)} reference rows")
-        return df
+        return check_window(data, "reference")
         
     except Exception as e:
         log.exception(f"Failed to load reference data: {e}")
         return None
 
 
-def load_current_data(limit: Optional[int] = None) -> Optional[pd.DataFrame]:
+def load_current_data(
+    limit: Optional[int] = None, columns: Optional[Sequence[str]] = None
+) -> Optional[FeatureColumns]:
     """
-    Load CURRENT data (newest N rows from transaction_features).
+    Load CURRENT data (last N rows inserted into transaction_features).
     
     This represents the "current distribution" - what's happening
     right now in production.
     
     Args:
         limit: Maximum number of rows (default from config)
+        columns: Features to load (default: the monitored ones)
     
     Returns:
-        DataFrame with features, or None if not enough data
+        Per-feature arrays, or None if not enough data
     """
     if limit is None:
         limit = config.drift.current_window_size
-    
-    # Query only the features we need for drift detection
-    # Use transaction_id for ordering (it's sequential) - DESC for newest
-    # Cast NUMERIC to DOUBLE PRECISION to get float instead of Decimal
-    query = """
-    SELECT 
-        transaction_id,
-        amount::double precision as amount,
-        COALESCE(amount_zscore, 0)::double precision as amount_zscore,
-        COALESCE(user_avg_amount_30d, 0)::double precision as user_avg_amount_30d,
-        COALESCE(user_txn_count_1h, 0)::double precision as user_txn_count_1h,
-        COALESCE(user_txn_count_24h, 0)::double precision as user_txn_count_24h,
-        COALESCE(user_txn_count_7d, 0)::double precision as user_txn_count_7d,
-        COALESCE(user_amount_sum_1h, 0)::double precision as user_amount_sum_1h,
-        COALESCE(user_amount_sum_24h, 0)::double precision as user_amount_sum_24h,
-        COALESCE(country_change_flag, false)::int as country_change_flag,
-        COALESCE(device_change_flag, false)::int as device_change_flag,
-        COALESCE(unique_countries_24h, 1)::double precision as unique_countries_24h,
-        COALESCE(unique_merchants_24h, 1)::double precision as unique_merchants_24h,
-        COALESCE(user_merchant_first_time, false)::int as user_merchant_first_time,
-        COALESCE(hour_of_day, 12)::double precision as hour_of_day,
-        COALESCE(day_of_week, 0)::double precision as day_of_week,
-        COALESCE(is_weekend, false)::int as is_weekend,
-        COALESCE(is_night, false)::int as is_night,
-        COALESCE(minutes_since_last_txn, 0)::double precision as minutes_since_last_txn,
-        COALESCE(channel_encoded, 0)::double precision as channel_encoded,
-        COALESCE(label, false)::int as label
-    FROM transaction_features
-    ORDER BY transaction_id DESC
-    LIMIT %s
-    """
+    if columns is None:
+        columns = drift_columns()
+    if too_few_rows():
+        return None
     
     try:
-        conn = get_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(query, (limit,))
-            rows = cur.fetchall()
-        conn.close()
-        
-        if not rows:
-            log.warning("No data found in transaction_features")
-            return None
-        
-        df = pd.DataFrame(rows)
-        
-        # Convert any remaining Decimal to float
-        df = convert_decimals(df)
-        
-        # Ensure numeric types
-        df = ensure_numeric(df)
-        
-        min_samples = config.drift.min_samples
-        if len(df) < min_samples:
-            log.warning(
-                f"Not enough current data: {len(df)} rows "
-                f"(need {min_samples})"
+        with borrow_conn() as conn:
+            data = fetch_feature_columns(
+                conn, CURRENT_WINDOW_SQL, (limit, limit), limit, columns
             )
-            return None
         
-        log.info(f"Loaded {len(df)} current rows")
-        return df
+        return check_window(data, "current")
         
     except Exception as e:
         log.exception(f"Failed to load current data: {e}")
         return None
 
 
-def load_reference_and_current() -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+# The reference window only changes when rows are added inside it, so it
+# is kept between drift checks and re-read only when its probe key moves
+_reference_cache: Dict[str, Any] = {"key": None, "data": None}
+_reference_cache_lock = threading.Lock()
+
+REFERENCE_KEY_SQL = """
+SELECT %s::int, COUNT(*), MAX(id)
+FROM (
+    SELECT id
+    FROM transaction_features
+    ORDER BY id ASC
+    LIMIT %s
+) w
+"""
+
+
+def reference_window_key(conn, limit: int) -> Tuple[Any, ...]:
+    """
+    Cheap fingerprint of the reference window: (limit, row count, last id).
+    
+    Served from the primary key index. New rows get higher ids, so once
+    the table holds more than `limit` rows the key only moves if rows
+    inside the window are deleted.
+    """
+    with conn.cursor() as cur:
+        cur.execute(REFERENCE_KEY_SQL, (limit, limit))
+        return tuple(cur.fetchone())
+
+
+def load_reference_and_current(
+    columns: Optional[Sequence[str]] = None,
+) -> Tuple[Optional[FeatureColumns], Optional[FeatureColumns]]:
     """
     Load both reference and current data.
     
+    The reference window is reused from the previous call while its key
+    is unchanged, so usually only the current window is read. Otherwise
+    both windows come from one statement (UNION ALL of the oldest and
+    newest rows, tagged with a bucket column) and are split client-side.
+    
+    Args:
+        columns: Features to load (default: the monitored ones)
+    
     Returns:
-        Tuple of (reference_df, current_df), either may be None
+        Tuple of (reference, current) feature arrays, either may be None
     """
-    reference = load_reference_data()
-    current = load_current_data()
-    return reference, current
+    reference_limit = config.drift.reference_window_size
+    current_limit = config.drift.current_window_size
+    if columns is None:
+        columns = drift_columns()
+    columns = tuple(columns)
+    select = feature_select(columns)
+    
+    query = f"""
+    (SELECT 0 as bucket, {select}
+     FROM transaction_features
+     ORDER BY id ASC
+     LIMIT %s)
+    UNION ALL
+    (SELECT 1 as bucket, {select}
+     FROM transaction_features
+     WHERE id > (SELECT MAX(id) FROM transaction_features) - %s
+     ORDER BY id ASC
+     LIMIT %s)
+    """
+    
+    if too_few_rows():
+        return None, None
+    
+    try:
+        with borrow_conn() as conn:
+            key = (columns,) + reference_window_key(conn, reference_limit)
+            
+            # The key counts the rows of the reference window, i.e. the
+            # whole table when it holds fewer than reference_limit rows.
+            # If that is below min_samples neither window can be used.
+            window_rows = key[2]
+            if window_rows < min(reference_limit, config.drift.min_samples):
+                log.warning(
+                    f"Not enough data: {window_rows} rows "
+                    f"(need {config.drift.min_samples})"
+                )
+                return None, None
+            
+            with _reference_cache_lock:
+                cached = _reference_cache["data"] if _reference_cache["key"] == key else None
+            
+            if cached is not None:
+                current = fetch_feature_columns(
+                    conn, CURRENT_WINDOW_SQL, (current_limit, current_limit),
+                    current_limit, columns,
+                )
+                log.info(f"Reusing cached reference window ({num_rows(cached)} rows)")
+                return check_window(cached, "reference"), check_window(current, "current")
+            
+            rows = fetch_rows(
+                conn, query, (reference_limit, current_limit, current_limit),
+                1 + len(columns), reference_limit + current_limit,
+            )
+    except Exception as e:
+        log.exception(f"Failed to load drift data: {e}")
+        return None, None
+    
+    # Split per column: each feature is gathered straight into its own
+    # contiguous array, instead of copying the row block and then
+    # re-laying it out column-major
+    is_current = rows[:, 0] == 1
+    is_reference = ~is_current
+    reference = fill_defaults({name: rows[is_reference, i] for i, name in enumerate(columns, 1)})
+    current = fill_defaults({name: rows[is_current, i] for i, name in enumerate(columns, 1)})
+    
+    with _reference_cache_lock:
+        _reference_cache["key"] = key
+        _reference_cache["data"] = reference
+    
+    return check_window(reference, "reference"), check_window(current, "current")
+
+
+# get_data_stats() aggregates over the whole table (COUNT(*) is a full
+# scan), so results are reused for a short while. Errors aren't cached.
+DATA_STATS_TTL_SECONDS = 30.0
+_data_stats_cache: Dict[str, Any] = {"stats": None, "ts": 0.0}
+_data_stats_lock = threading.Lock()
 
 
 def get_data_stats() -> Dict[str, Any]:
     """
     Get statistics about available data.
     
+    Served from a cache for DATA_STATS_TTL_SECONDS; concurrent callers
+    after expiry wait for a single refresh instead of each querying.
+    
     Returns:
         Dictionary with counts and date ranges
     """
+    with _data_stats_lock:
+        if (
+            _data_stats_cache["stats"] is not None
+            and time.monotonic() - _data_stats_cache["ts"] < DATA_STATS_TTL_SECONDS
+        ):
+            return _data_stats_cache["stats"]
+        
+        stats = query_data_stats()
+        if "error" not in stats:
+            _data_stats_cache["stats"] = stats
+            _data_stats_cache["ts"] = time.monotonic()
+        return stats
+
+
+def query_data_stats() -> Dict[str, Any]:
+    """Run the statistics query behind get_data_stats()."""
     query = """
     SELECT 
         COUNT(*) as total_rows,
-        MIN(transaction_id) as oldest_txn,
-        MAX(transaction_id) as newest_txn
+        (SELECT transaction_id FROM transaction_features ORDER BY id ASC LIMIT 1) as oldest_txn,
+        (SELECT transaction_id FROM transaction_features ORDER BY id DESC LIMIT 1) as newest_txn
     FROM transaction_features
     """
     
     try:
-        conn = get_connection()
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(query)
-            result = cur.fetchone()
-        conn.close()
+        with borrow_conn() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(query)
+                result = cur.fetchone()
         
         if result is None:
             return {"error": "No data found"}
@@ -4,7 +4,10 @@ DATABASE MODULE - Handles saving features to PostgreSQL
 
 This module provides database operations for the feature consumer:
 1. Connect to PostgreSQL with retry logic
-2. Insert feature rows (with UPSERT to handle duplicates)
+2. Insert feature rows in batches (with a prepared UPSERT to handle duplicates)
+
+Uses psycopg 3: statements are prepared server-side automatically, and a
+batch write (UPSERT + COMMIT) goes out in pipeline mode as one round trip.
 
 WHY UPSERT?
 -----------
@@ -21,10 +24,12 @@ This makes our system IDEMPOTENT (safe to run multiple times).
 import os
 import time
 import logging
-from typing import Any, Dict
+from operator import attrgetter
+from typing import List
+
+import psycopg
 
-import psycopg2
-import psycopg2.extras
+from features import FeatureRow
 
 log = logging.getLogger("feature_consumer.db")
 
@@ -51,7 +56,7 @@ def connect_with_retry(max_attempts: int = 60, sleep_s: float = 1.0):
         sleep_s: Seconds to wait between attempts
     
     Returns:
-        psycopg2 connection object
+        psycopg connection object
     
     Raises:
         RuntimeError if connection fails after all attempts
@@ -60,8 +65,7 @@ def connect_with_retry(max_attempts: int = 60, sleep_s: float = 1.0):
     
     for attempt in range(1, max_attempts + 1):
         try:
-            conn = psycopg2.connect(dsn)
-            conn.autocommit = False  # We'll manage transactions manually
+            conn = psycopg.connect(dsn, autocommit=False)  # We'll manage transactions manually
             log.info("Connected to PostgreSQL")
             return conn
         except Exception as e:
@@ -79,84 +83,59 @@ def connect_with_retry(max_attempts: int = 60, sleep_s: float = 1.0):
 # ON CONFLICT (transaction_id) DO UPDATE:
 # - If transaction_id already exists, update all fields
 # - This ensures idempotency (safe to process same transaction twice)
+#
+# Each batch is a single statement that passes one array per column;
+# unnest() turns the arrays back into rows, so the same statement text
+# serves every batch size. It is executed with prepare=True: psycopg
+# PREPAREs it on first use per connection, so Postgres parses and plans
+# it once.
 # =============================================================================
 
-UPSERT_FEATURES_SQL = """
-INSERT INTO transaction_features (
-    transaction_id,
-    user_id,
-    event_time,
-    
-    amount,
-    amount_zscore,
-    
-    user_txn_count_1h,
-    user_txn_count_24h,
-    user_txn_count_7d,
-    user_amount_sum_1h,
-    user_amount_sum_24h,
-    user_avg_amount_30d,
-    user_std_amount_30d,
-    
-    country_change_flag,
-    device_change_flag,
-    unique_countries_24h,
-    unique_merchants_24h,
-    unique_devices_24h,
-    user_merchant_first_time,
-    
-    hour_of_day,
-    day_of_week,
-    is_weekend,
-    is_night,
-    minutes_since_last_txn,
-    
-    channel,
-    channel_encoded,
-    
-    country,
-    is_foreign_txn,
-    
-    label
-)
-VALUES (
-    %(transaction_id)s,
-    %(user_id)s,
-    %(event_time)s,
-    
-    %(amount)s,
-    %(amount_zscore)s,
-    
-    %(user_txn_count_1h)s,
-    %(user_txn_count_24h)s,
-    %(user_txn_count_7d)s,
-    %(user_amount_sum_1h)s,
-    %(user_amount_sum_24h)s,
-    %(user_avg_amount_30d)s,
-    %(user_std_amount_30d)s,
-    
-    %(country_change_flag)s,
-    %(device_change_flag)s,
-    %(unique_countries_24h)s,
-    %(unique_merchants_24h)s,
-    %(unique_devices_24h)s,
-    %(user_merchant_first_time)s,
-    
-    %(hour_of_day)s,
-    %(day_of_week)s,
-    %(is_weekend)s,
-    %(is_night)s,
-    %(minutes_since_last_txn)s,
-    
-    %(channel)s,
-    %(channel_encoded)s,
-    
-    %(country)s,
-    %(is_foreign_txn)s,
-    
-    %(label)s
+# (column, Postgres type) for every column written by the consumer
+FEATURE_COLUMN_TYPES = (
+    ("transaction_id", "uuid"),
+    ("user_id", "text"),
+    ("event_time", "timestamptz"),
+    
+    ("amount", "numeric"),
+    ("amount_zscore", "numeric"),
+    
+    ("user_txn_count_1h", "integer"),
+    ("user_txn_count_24h", "integer"),
+    ("user_txn_count_7d", "integer"),
+    ("user_amount_sum_1h", "numeric"),
+    ("user_amount_sum_24h", "numeric"),
+    ("user_avg_amount_30d", "numeric"),
+    ("user_std_amount_30d", "numeric"),
+    
+    ("country_change_flag", "boolean"),
+    ("device_change_flag", "boolean"),
+    ("unique_countries_24h", "integer"),
+    ("unique_merchants_24h", "integer"),
+    ("unique_devices_24h", "integer"),
+    ("user_merchant_first_time", "boolean"),
+    
+    ("hour_of_day", "integer"),
+    ("day_of_week", "integer"),
+    ("is_weekend", "boolean"),
+    ("is_night", "boolean"),
+    ("minutes_since_last_txn", "integer"),
+    
+    ("channel", "text"),
+    ("channel_encoded", "integer"),
+    
+    ("country", "text"),
+    ("is_foreign_txn", "boolean"),
+    
+    ("label", "boolean"),
 )
-ON CONFLICT (transaction_id) DO UPDATE SET
+
+FEATURE_COLUMNS = tuple(name for name, _ in FEATURE_COLUMN_TYPES)
+
+# Pulls one row's values out of a FeatureRow as a tuple in column order
+_row_values = attrgetter(*FEATURE_COLUMNS)
+
+UPSERT_CONFLICT_SQL = """ON CONFLICT (transaction_id) DO UPDATE SET
     amount_zscore = EXCLUDED.amount_zscore,
     user_txn_count_1h = EXCLUDED.user_txn_count_1h,
     user_txn_count_24h = EXCLUDED.user_txn_count_24h,
@@ -172,45 +151,108 @@ ON CONFLICT (transaction_id) DO UPDATE SET
     unique_devices_24h = EXCLUDED.unique_devices_24h,
     user_merchant_first_time = EXCLUDED.user_merchant_first_time,
     minutes_since_last_txn = EXCLUDED.minutes_since_last_txn,
-    computed_at = now();
+    computed_at = now()"""
+
+# psycopg won't dump a list that mixes int and float (an empty window
+# sums to int 0), so values for numeric columns are sent as floats
+NUMERIC_COLUMNS = frozenset(name for name, t in FEATURE_COLUMN_TYPES if t == "numeric")
+
+# %b sends the arrays in binary format: floats, ints, bools and
+# timestamps go over the wire as fixed-width values that the server
+# doesn't have to parse. The explicit casts give all-NULL arrays a type
+# and turn float8/text elements into numeric/uuid.
+UPSERT_FEATURES_SQL = f"""
+INSERT INTO transaction_features ({", ".join(FEATURE_COLUMNS)})
+SELECT * FROM unnest({", ".join(f"%b::{t}[]" for _, t in FEATURE_COLUMN_TYPES)})
+{UPSERT_CONFLICT_SQL}
 """
 
 
-def upsert_features(conn, features: Dict[str, Any]) -> None:
+def upsert_features_batch(conn, features_list: List[FeatureRow]) -> None:
     """
-    Insert or update a feature row in the database.
+    Insert or update many feature rows with one prepared UPSERT.
+    
+    Does not commit; the caller commits once for the whole batch.
     
     Args:
         conn: PostgreSQL connection
-        features: Dictionary of feature values from FeatureCalculator
+        features_list: Feature rows from FeatureCalculator
     """
+    if not features_list:
+        return
+    
+    # A single INSERT ... ON CONFLICT DO UPDATE can't touch the same row
+    # twice, so a transaction redelivered within one batch keeps only its
+    # latest features
+    by_txn = {f.transaction_id: f for f in features_list}
+    if len(by_txn) != len(features_list):
+        features_list = list(by_txn.values())
+    
+    # Rows as positional tuples, transposed to one list per column
+    columns = []
+    for name, values in zip(FEATURE_COLUMNS, zip(*map(_row_values, features_list))):
+        if name in NUMERIC_COLUMNS:
+            values = [None if v is None else float(v) for v in values]
+        columns.append(list(values))
+    
     with conn.cursor() as cur:
-        cur.execute(UPSERT_FEATURES_SQL, features)
+        cur.execute(UPSERT_FEATURES_SQL, columns, prepare=True)
+
+
+def write_features_batch(conn, features_list: List[FeatureRow]) -> None:
+    """
+    Upsert a batch and commit it.
+    
+    In pipeline mode BEGIN, the UPSERT and COMMIT are sent together and
+    their results read back once, instead of a round trip per statement.
+    
+    Args:
+        conn: PostgreSQL connection
+        features_list: Feature rows from FeatureCalculator
+    """
+    with conn.pipeline():
+        upsert_features_batch(conn, features_list)
+        conn.commit()
+
+
+def upsert_features(conn, features: FeatureRow) -> None:
+    """
+    Insert or update a feature row in the database.
+    
+    Args:
+        conn: PostgreSQL connection
+        features: Feature row from FeatureCalculator
+    """
+    upsert_features_batch(conn, [features])
 
 
 def ensure_features_table_exists(conn) -> None:
     """
     Check if transaction_features table exists.
     If not, log a warning (user needs to run migration).
+    
+    The lookup runs in autocommit mode, so it opens no transaction and
+    the caller has nothing to commit or roll back afterwards.
     """
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'transaction_features'
-            );
-        """)
-        exists = cur.fetchone()[0]
-        
-        if not exists:
-            log.error(
-                "Table 'transaction_features' does not exist! "
-                "Please run the migration: 002_transaction_features.sql"
-            )
-            raise RuntimeError("Missing transaction_features table")
-        
-        log.info("Table 'transaction_features' exists")
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            # to_regclass() is a single catalog lookup; the information_schema
+            # views join several pg_catalog tables to answer the same question
+            cur.execute("SELECT to_regclass('public.transaction_features') IS NOT NULL")
+            exists = cur.fetchone()[0]
+    finally:
+        conn.autocommit = autocommit
+    
+    if not exists:
+        log.error(
+            "Table 'transaction_features' does not exist! "
+            "Please run the migration: 002_transaction_features.sql"
+        )
+        raise RuntimeError("Missing transaction_features table")
+    
+    log.info("Table 'transaction_features' exists")
 
 
 def get_feature_count(conn) -> int:
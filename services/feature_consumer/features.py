@@ -29,18 +29,24 @@ USAGE:
     
     # For each transaction:
     user_state = store.add_transaction(user_id, txn_data)
-    features = calculator.calculate(txn_data, user_state)
-    # features is a dict ready to insert into database
+    row = calculator.calculate(txn_data, user_state)
+    # row is a FeatureRow ready to insert into database
+    
+    # Or a batch at a time (also adds the transactions to the store):
+    rows = calculator.calculate_batch(txns, store)
 
 ================================================================================
 """
 
 import logging
-from datetime import datetime, timedelta, timezone
-from typing import Dict, Any, Optional
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
 
-from state import UserState
+from state import StateStore, UserState, hours_to_ns, to_ns
+
+_NS_PER_MINUTE = 60_000_000_000
 
 log = logging.getLogger("feature_consumer.features")
 
@@ -70,6 +76,70 @@ class FeatureConfig:
             }
 
 
+@dataclass(slots=True)
+class FeatureRow:
+    """
+    The features of one transaction: one transaction_features row.
+    
+    Amounts are not rounded here; the NUMERIC columns round them to their
+    scale on insert.
+    """
+    # Identifiers
+    transaction_id: str
+    user_id: str
+    event_time: datetime
+    
+    # Original data
+    amount: float
+    channel: str
+    country: str
+    label: Optional[bool]
+    
+    # Amount features
+    amount_zscore: Optional[float] = None
+    user_avg_amount_30d: Optional[float] = None
+    user_std_amount_30d: Optional[float] = None
+    
+    # Velocity features
+    user_txn_count_1h: int = 0
+    user_txn_count_24h: int = 0
+    user_txn_count_7d: int = 0
+    user_amount_sum_1h: float = 0.0
+    user_amount_sum_24h: float = 0.0
+    
+    # Behavioral features
+    country_change_flag: bool = False
+    device_change_flag: bool = False
+    unique_countries_24h: int = 0
+    unique_merchants_24h: int = 0
+    unique_devices_24h: int = 0
+    user_merchant_first_time: bool = True
+    is_foreign_txn: Optional[bool] = None
+    
+    # Time features
+    hour_of_day: int = 0
+    day_of_week: int = 0
+    is_weekend: bool = False
+    is_night: bool = False
+    minutes_since_last_txn: Optional[int] = None
+    
+    # Channel features
+    channel_encoded: int = -1
+
+
+def _velocity_fields(hours: int) -> Tuple[str, Optional[str]]:
+    """
+    (count field, amount sum field or None) of FeatureRow for a velocity
+    window: 1 -> user_txn_count_1h, 168 -> user_txn_count_7d, ...
+    """
+    suffix = f"{hours // 24}d" if hours > 24 and hours % 24 == 0 else f"{hours}h"
+    count_field = f"user_txn_count_{suffix}"
+    sum_field = f"user_amount_sum_{suffix}"
+    if count_field not in FeatureRow.__slots__:
+        raise ValueError(f"No transaction_features column for a {hours}h velocity window")
+    return count_field, sum_field if sum_field in FeatureRow.__slots__ else None
+
+
 class FeatureCalculator:
     """
     Calculates features for a transaction based on user history.
@@ -78,11 +148,13 @@ class FeatureCalculator:
     --------
         calculator = FeatureCalculator()
         
+        now = datetime.now(timezone.utc)
         txn = {
             "transaction_id": "abc-123",
             "user_id": "U000001",
             "amount": 500.00,
-            "event_time": datetime.now(),
+            "event_time": now,           # timezone-aware datetime
+            "event_ns": to_ns(now),      # the same instant in ns
             "country": "US",
             "merchant_id": "M000001",
             "channel": "ECOM",
@@ -91,84 +163,146 @@ class FeatureCalculator:
         }
         
         user_state = store.get_or_create_user("U000001")
-        features = calculator.calculate(txn, user_state)
+        row = calculator.calculate(txn, user_state)
         
-        # features dict contains all computed features
+        # row is a FeatureRow with all computed features
     """
     
     def __init__(self, config: Optional[FeatureConfig] = None):
         self.config = config or FeatureConfig()
+        
+        # Window lengths in ns, and the FeatureRow fields each velocity
+        # window fills (the amount sum only where the table has a column)
+        self._velocity_windows_ns = tuple(
+            hours_to_ns(hours) for hours in self.config.velocity_windows_hours
+        )
+        self._velocity_fields = tuple(
+            _velocity_fields(hours) for hours in self.config.velocity_windows_hours
+        )
+        self._unique_window_ns = hours_to_ns(24)  # unique_*_24h
+        self._stats_window_ns = hours_to_ns(self.config.amount_history_days * 24)
+        
+        # Channel -> code lookup, bound once
+        self._encode_channel = self.config.channel_encoding.get
+        
         log.info("FeatureCalculator initialized")
     
-    def calculate(self, txn: Dict[str, Any], user_state: UserState) -> Dict[str, Any]:
+    def calculate(self, txn: Dict[str, Any], user_state: UserState) -> FeatureRow:
         """
         Calculate all features for a transaction.
         
         Args:
-            txn: Transaction data dictionary
+            txn: Transaction data dictionary; event_time must be a
+                 timezone-aware datetime and event_ns the same instant as
+                 to_ns() nanoseconds
             user_state: User's historical state (BEFORE this transaction is added)
         
         Returns:
-            Dictionary of features ready for database insertion
+            FeatureRow ready for database insertion
         """
+        # Parsed and normalized once at ingress (see app.build_txn_data)
         event_time = txn["event_time"]
-        if isinstance(event_time, str):
-            event_time = datetime.fromisoformat(event_time)
-        
-        # Ensure timezone aware
-        if event_time.tzinfo is None:
-            event_time = event_time.replace(tzinfo=timezone.utc)
+        event_ns = txn["event_ns"]
         
         amount = float(txn["amount"])
         
         # ====================================================================
-        # Build features dictionary
+        # Build the feature row (identifiers and original data)
         # ====================================================================
-        features = {
-            # Identifiers
-            "transaction_id": txn["transaction_id"],
-            "user_id": txn["user_id"],
-            "event_time": event_time,
-            
-            # Original data
-            "amount": amount,
-            "channel": txn["channel"],
-            "country": txn["country"],
-            "label": txn.get("label"),
-        }
+        row = FeatureRow(
+            transaction_id=txn["transaction_id"],
+            user_id=txn["user_id"],
+            event_time=event_time,
+            amount=amount,
+            channel=txn["channel"],
+            country=txn["country"],
+            label=txn.get("label"),
+        )
+        
+        # Every history statistic (1h/24h/7d windows, 30d amount stats) in
+        # one call, instead of one history query per feature
+        stats = user_state.compute_all(
+            event_ns,
+            self._velocity_windows_ns,
+            self._unique_window_ns,
+            self._stats_window_ns,
+        )
         
         # ====================================================================
         # VELOCITY FEATURES
         # ====================================================================
-        features.update(self._calculate_velocity_features(user_state, event_time))
+        self._calculate_velocity_features(row, stats)
         
         # ====================================================================
         # AMOUNT FEATURES  
         # ====================================================================
-        features.update(self._calculate_amount_features(amount, user_state, event_time))
+        self._calculate_amount_features(row, stats)
         
         # ====================================================================
         # BEHAVIORAL FEATURES
         # ====================================================================
-        features.update(self._calculate_behavioral_features(txn, user_state, event_time))
+        self._calculate_behavioral_features(row, txn, user_state, stats)
         
         # ====================================================================
         # TIME FEATURES
         # ====================================================================
-        features.update(self._calculate_time_features(event_time, user_state))
+        self._calculate_time_features(row, event_ns, user_state)
         
         # ====================================================================
         # CHANNEL FEATURES
         # ====================================================================
-        features.update(self._calculate_channel_features(txn))
+        self._calculate_channel_features(row)
         
-        return features
+        return row
     
-    def _calculate_velocity_features(
-        self, 
-        user_state: UserState, 
-        event_time: datetime
-    ) -> Dict[str, Any]:
+    def calculate_batch(
+        self,
+        txns: List[Dict[str, Any]],
+        store: StateStore,
+        on_error: Optional[Callable[[Dict[str, Any], Exception], None]] = None,
+    ) -> List[Optional[FeatureRow]]:
+        """
+        Calculate features for a batch of transactions, adding each one to
+        the store after its features are calculated.
+        
+        The batch is grouped by user, so each user's state is looked up once
+        and their transactions run back to back over the same arrays. Within
+        a user, transactions keep their order in the batch: the result is
+        the same as calculate() then store.add_transaction() per transaction.
+        
+        Args:
+            txns: Transaction data dictionaries, in arrival order
+            store: State store with the users' history (updated in place)
+            on_error: Called with (txn, exception) when a transaction fails;
+                      its result is None and it is not added to the store.
+                      Without it the exception propagates.
+        
+        Returns:
+            Features for each transaction, in the order of txns
+        """
+        by_user: Dict[str, List[int]] = defaultdict(list)
+        for i, txn in enumerate(txns):
+            by_user[txn["user_id"]].append(i)
+        
+        results: List[Optional[FeatureRow]] = [None] * len(txns)
+        for user_id, indices in by_user.items():
+            user_state = store.get_or_create_user(user_id)
+            for i in indices:
+                txn = txns[i]
+                try:
+                    row = self.calculate(txn, user_state)
+                    # Same state back unless the store evicted the user
+                    user_state = store.add_transaction(user_id, txn)
+                    results[i] = row
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    on_error(txn, e)
+        
+        return results
+    
+    
+    def _calculate_velocity_features(self, row: FeatureRow, stats: Dict[str, Any]) -> None:
         """
         Calculate velocity features (how fast user is transacting).
         
@@ -176,35 +310,18 @@ class FeatureCalculator:
         - Stolen card being used rapidly
         - Bot/automated fraud
         """
-        features = {}
-        
-        # Transaction counts
-        features["user_txn_count_1h"] = user_state.get_transaction_count(
-            hours=1, current_time=event_time
-        )
-        features["user_txn_count_24h"] = user_state.get_transaction_count(
-            hours=24, current_time=event_time
-        )
-        features["user_txn_count_7d"] = user_state.get_transaction_count(
-            hours=168, current_time=event_time  # 7 * 24 = 168
-        )
-        
-        # Amount sums
-        features["user_amount_sum_1h"] = round(
-            user_state.get_amount_sum(hours=1, current_time=event_time), 2
-        )
-        features["user_amount_sum_24h"] = round(
-            user_state.get_amount_sum(hours=24, current_time=event_time), 2
-        )
-        
-        return features
+        counts = stats["count"]
+        sums = stats["amount_sum"]
+        
+        # Transaction counts and amount sums per window
+        for window_ns, (count_field, sum_field) in zip(
+            self._velocity_windows_ns, self._velocity_fields
+        ):
+            setattr(row, count_field, counts[window_ns])
+            if sum_field is not None:
+                setattr(row, sum_field, sums[window_ns])
     
-    def _calculate_amount_features(
-        self,
-        amount: float,
-        user_state: UserState,
-        event_time: datetime
-    ) -> Dict[str, Any]:
+    def _calculate_amount_features(self, row: FeatureRow, stats: Dict[str, Any]) -> None:
         """
         Calculate amount-related features.
         
@@ -212,34 +329,27 @@ class FeatureCalculator:
         - Stolen card used for large purchase
         - Testing card with small amounts
         """
-        features = {}
-        
-        # Get historical statistics
-        mean, std = user_state.get_amount_stats(
-            days=self.config.amount_history_days,
-            current_time=event_time
-        )
+        # Historical statistics
+        mean, std = stats["amount_mean"], stats["amount_std"]
         
-        features["user_avg_amount_30d"] = round(mean, 2) if mean else None
-        features["user_std_amount_30d"] = round(std, 2) if std else None
+        row.user_avg_amount_30d = mean if mean else None
+        row.user_std_amount_30d = std if std else None
         
-        # Calculate Z-score
         # Z-score = (value - mean) / std_dev
         # High z-score means this amount is unusual for this user
-        if mean is not None and std is not None and std > 0:
-            zscore = (amount - mean) / std
-            features["amount_zscore"] = round(zscore, 4)
+        # (mean and std are both None below 2 transactions; std >= 0)
+        if std:
+            row.amount_zscore = (row.amount - mean) / std
         else:
-            features["amount_zscore"] = None
-        
-        return features
+            row.amount_zscore = None
     
     def _calculate_behavioral_features(
         self,
+        row: FeatureRow,
         txn: Dict[str, Any],
         user_state: UserState,
-        event_time: datetime
-    ) -> Dict[str, Any]:
+        stats: Dict[str, Any],
+    ) -> None:
         """
         Calculate behavioral features (is user acting differently?).
         
@@ -247,53 +357,45 @@ class FeatureCalculator:
         - Account takeover
         - Card stolen and used in different location
         """
-        features = {}
-        
         # Country change detection
         # If user's last transaction was in Bangladesh, and now it's US, suspicious!
-        features["country_change_flag"] = (
+        row.country_change_flag = (
             user_state.last_country is not None 
-            and user_state.last_country != txn["country"]
+            and user_state.last_country != row.country
         )
         
         # Device change detection
         current_device = txn.get("device_id")
-        features["device_change_flag"] = (
+        row.device_change_flag = (
             user_state.last_device is not None
             and current_device is not None
             and user_state.last_device != current_device
         )
         
         # Unique counts (diversity features)
-        features["unique_countries_24h"] = user_state.get_unique_countries(
-            hours=24, current_time=event_time
-        )
-        features["unique_merchants_24h"] = user_state.get_unique_merchants(
-            hours=24, current_time=event_time
-        )
-        features["unique_devices_24h"] = user_state.get_unique_devices(
-            hours=24, current_time=event_time
-        )
+        row.unique_countries_24h = stats["unique_countries"]
+        row.unique_merchants_24h = stats["unique_merchants"]
+        row.unique_devices_24h = stats["unique_devices"]
         
         # First time at merchant?
-        features["user_merchant_first_time"] = user_state.is_merchant_first_time(
+        row.user_merchant_first_time = user_state.is_merchant_first_time(
             txn["merchant_id"]
         )
         
         # Is this a foreign transaction?
         # (different from user's most common country)
-        if user_state.home_country:
-            features["is_foreign_txn"] = txn["country"] != user_state.home_country
+        home_country = user_state.home_country
+        if home_country:
+            row.is_foreign_txn = row.country != home_country
         else:
-            features["is_foreign_txn"] = None
-        
-        return features
+            row.is_foreign_txn = None
     
     def _calculate_time_features(
         self,
-        event_time: datetime,
+        row: FeatureRow,
+        event_ns: int,
         user_state: UserState
-    ) -> Dict[str, Any]:
+    ) -> None:
         """
         Calculate time-based features.
         
@@ -302,33 +404,30 @@ class FeatureCalculator:
         - Weekend patterns
         - Rapid transactions (time since last)
         """
-        features = {}
+        event_time = row.event_time
         
         # Hour of day (0-23)
-        features["hour_of_day"] = event_time.hour
+        row.hour_of_day = event_time.hour
         
         # Day of week (0=Monday, 6=Sunday)
-        features["day_of_week"] = event_time.weekday()
+        row.day_of_week = event_time.weekday()
         
         # Is weekend?
-        features["is_weekend"] = event_time.weekday() >= 5
+        row.is_weekend = row.day_of_week >= 5
         
         # Is night? (00:00 to 06:00)
-        features["is_night"] = event_time.hour < 6
+        row.is_night = row.hour_of_day < 6
         
         # Minutes since last transaction
-        if user_state.last_txn_time:
-            delta = event_time - user_state.last_txn_time
-            minutes = int(delta.total_seconds() / 60)
+        if user_state.last_txn_ns is not None:
+            minutes = int((event_ns - user_state.last_txn_ns) / _NS_PER_MINUTE)
             # Cap at reasonable max (1 week in minutes)
-            features["minutes_since_last_txn"] = min(minutes, 10080)
+            row.minutes_since_last_txn = min(minutes, 10080)
         else:
             # First transaction for this user
-            features["minutes_since_last_txn"] = None
-        
-        return features
+            row.minutes_since_last_txn = None
     
-    def _calculate_channel_features(self, txn: Dict[str, Any]) -> Dict[str, Any]:
+    def _calculate_channel_features(self, row: FeatureRow) -> None:
         """
         Calculate channel-related features.
         
@@ -337,13 +436,7 @@ class FeatureCalculator:
         - ECOM: Online, higher risk (card-not-present)
         - ATM: Cash withdrawal, medium risk
         """
-        features = {}
-        
-        channel = txn["channel"]
-        features["channel_encoded"] = self.config.channel_encoding.get(channel, -1)
-        
-        return features
-
+        row.channel_encoded = self._encode_channel(row.channel, -1)
 
 # =============================================================================
 # FEATURE DOCUMENTATION
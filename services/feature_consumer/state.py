@@ -9,9 +9,12 @@ what each user did recently. This module stores that history in memory.
 
 HOW IT WORKS:
 -------------
-1. For each user, we keep a list of their recent transactions
-2. When a new transaction arrives, we add it to the user's history
-3. We periodically clean up old transactions to save memory
+1. For each user, we keep their recent transactions as NumPy columns
+   (timestamps, amounts, country/merchant/device codes)
+2. When a new transaction arrives, we append it to the user's columns
+3. Window features ("count in last 1h") are vectorized mask-and-reduce
+   operations over those columns
+4. We periodically clean up old transactions to save memory
 
 EXAMPLE:
 --------
@@ -40,17 +43,71 @@ LIMITATIONS:
 """
 
 import logging
-from collections import defaultdict
+from collections import Counter, defaultdict
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Deque
-from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+import heapq
 import threading
 
+import numpy as np
+
+
 log = logging.getLogger("feature_consumer.state")
 
+# Transactions kept per user (the oldest is dropped first)
+HISTORY_MAXLEN = 500
+
+# Lock stripes in StateStore
+NUM_SHARDS = 64
+
+_INITIAL_CAPACITY = 8
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_US = timedelta(microseconds=1)
+_NS_PER_MINUTE = 60_000_000_000
+_NS_PER_HOUR = 60 * _NS_PER_MINUTE
+
+
+def to_ns(dt: datetime) -> int:
+    """Timezone-aware datetime -> integer nanoseconds since the Unix epoch."""
+    return (dt - _EPOCH) // _ONE_US * 1000
+
+
+def hours_to_ns(hours: float) -> int:
+    """Window length in hours -> integer nanoseconds."""
+    return int(hours * _NS_PER_HOUR)
+
+
+# Countries, merchants and devices are stored as small integer codes, so
+# the history columns are plain int arrays. Codes are never reused.
+_codes: Dict[str, int] = {}
+_code_values: List[str] = []
+_codes_lock = threading.Lock()
 
-@dataclass
+
+def intern_code(value: Optional[str]) -> int:
+    """Integer code for a string (-1 for None)."""
+    if value is None:
+        return -1
+    code = _codes.get(value)
+    if code is None:
+        # New values are rare; the lock keeps concurrent shards from
+        # handing out the same code twice
+        with _codes_lock:
+            code = _codes.get(value)
+            if code is None:
+                code = _codes[value] = len(_code_values)
+                _code_values.append(value)
+    return code
+
+
+def code_value(code: int) -> Optional[str]:
+    """The string behind an intern_code() code (None for -1)."""
+    return None if code < 0 else _code_values[code]
+
+
+@dataclass(slots=True)
 class Transaction:
     """
     A simple container for transaction data.
@@ -76,102 +133,373 @@ class Transaction:
         }
 
 
-@dataclass
+class SlidingAggregator:
+    """
+    Running aggregates over one time window of a user's history
+    ("transactions in the last N hours").
+    
+    Covers the history entries [head:end): each transaction is added as
+    it is appended, and UserState evicts entries at the head once they
+    are older than the window. Every entry is added and evicted once, so
+    upkeep is O(1) amortized and queries just read the fields.
+    
+    Eviction goes in insertion order: an out-of-order (late) event stays
+    counted until the entries ahead of it have left the window.
+    """
+    
+    __slots__ = ("window_ns", "head", "count", "amount_sum", "amount_mean", "amount_m2", "code_counts")
+    
+    def __init__(self, window_ns: int, head: int):
+        self.window_ns = window_ns
+        self.head = head
+        self.count = 0
+        self.amount_sum = 0.0
+        # Welford running mean and sum of squared deviations of amounts
+        self.amount_mean = 0.0
+        self.amount_m2 = 0.0
+        # Column name -> {code: occurrences}; only for the columns whose
+        # distinct count has been asked for
+        self.code_counts: Dict[str, Dict[int, int]] = {}
+    
+    def add(self, amount: float, codes: Dict[str, int]) -> None:
+        self.count += 1
+        self.amount_sum += amount
+        delta = amount - self.amount_mean
+        self.amount_mean += delta / self.count
+        self.amount_m2 += delta * (amount - self.amount_mean)
+        for name, counts in self.code_counts.items():
+            code = codes[name]
+            counts[code] = counts.get(code, 0) + 1
+    
+    def remove(self, amount: float, codes: Dict[str, int]) -> None:
+        self.count -= 1
+        if self.count:
+            self.amount_sum -= amount
+            # Welford's update run backwards
+            delta = amount - self.amount_mean
+            self.amount_mean -= delta / self.count
+            self.amount_m2 = max(self.amount_m2 - delta * (amount - self.amount_mean), 0.0)
+        else:
+            # Reset at empty so float residue can't build up
+            self.amount_sum = self.amount_mean = self.amount_m2 = 0.0
+        for name, counts in self.code_counts.items():
+            code = codes[name]
+            left = counts[code] - 1
+            if left:
+                counts[code] = left
+            else:
+                del counts[code]
+    
+    def amount_stats(self) -> tuple:
+        """(mean, population std) of the amounts in the window, or (None, None) below 2."""
+        if self.count < 2:
+            return None, None
+        return self.amount_mean, (self.amount_m2 / self.count) ** 0.5
+
+
+def _column(dtype) -> np.ndarray:
+    return np.empty(_INITIAL_CAPACITY, dtype=dtype)
+
+
+@dataclass(slots=True)
 class UserState:
     """
     Stores the transaction history for ONE user.
     
-    Uses a deque (double-ended queue) which automatically removes
-    old items when it gets too full (maxlen=500).
+    History is held column-wise in NumPy arrays. The live entries are
+    the slice [_start:_end): appends go at _end, and past HISTORY_MAXLEN
+    the oldest entry is dropped by advancing _start. When the arrays run
+    out of room the live slice is moved back to the front (or the arrays
+    are doubled first), so it never wraps and is always a cheap view.
+    
+    Window counts, sums, distinct counts and amount mean/std come from a
+    SlidingAggregator per window length, created on first use and kept
+    up to date as transactions are added.
     """
-    # Recent transactions (newest last)
-    # maxlen=500 means we keep at most 500 transactions per user
-    transactions: Deque[Transaction] = field(
-        default_factory=lambda: deque(maxlen=500)
-    )
+    # History columns (see _COLUMNS)
+    _ts: np.ndarray = field(default_factory=lambda: _column(np.int64), repr=False)
+    _amount: np.ndarray = field(default_factory=lambda: _column(np.float64), repr=False)
+    _country: np.ndarray = field(default_factory=lambda: _column(np.int32), repr=False)
+    _merchant: np.ndarray = field(default_factory=lambda: _column(np.int32), repr=False)
+    _device: np.ndarray = field(default_factory=lambda: _column(np.int32), repr=False)
+    _start: int = 0
+    _end: int = 0
+    # Index of the newest entry that arrived out of time order (the live
+    # slice is sorted by time when this is before _start)
+    _last_late: int = -1
     
-    # User's "home" country (most common country in their history)
-    home_country: Optional[str] = None
+    # Window length in ns -> its running aggregates
+    _windows: Dict[int, SlidingAggregator] = field(default_factory=dict, repr=False)
     
-    # Set of merchants this user has visited
+    # Country code -> occurrences in the history, and the most common one
+    # (the user's "home" country, see home_country)
+    country_counts: Dict[int, int] = field(default_factory=dict, repr=False)
+    _home_id: Optional[int] = None
+    
+    # Set of merchants this user has visited (as intern_code() codes)
     known_merchants: set = field(default_factory=set)
     
-    # Last transaction time (for calculating time since last)
+    # Last transaction time (for calculating time since last), also as ns
     last_txn_time: Optional[datetime] = None
+    last_txn_ns: Optional[int] = None
     last_country: Optional[str] = None
     last_device: Optional[str] = None
     
+    _COLUMNS = ("_ts", "_amount", "_country", "_merchant", "_device")
+    
+    def __len__(self) -> int:
+        return self._end - self._start
+    
+    @property
+    def home_country(self) -> Optional[str]:
+        """User's "home" country (most common country in their history)."""
+        if self._home_id is None:
+            return None
+        return code_value(self._home_id)
+    
     def add_transaction(self, txn: Transaction) -> None:
         """Add a new transaction to this user's history."""
-        self.transactions.append(txn)
-        self.known_merchants.add(txn.merchant_id)
+        self.append(txn.event_time, txn.amount, txn.country, txn.merchant_id, txn.device_id)
+    
+    def append(
+        self,
+        event_time: datetime,
+        amount: float,
+        country: str,
+        merchant_id: str,
+        device_id: Optional[str],
+        event_ns: Optional[int] = None,
+    ) -> None:
+        """
+        Add a transaction from its field values (no Transaction object needed).
+        
+        event_ns is event_time as to_ns() nanoseconds, if the caller has it.
+        """
+        if event_ns is None:
+            event_ns = to_ns(event_time)
+        if self._end == self._ts.size:
+            self._make_room()
+        i = self._end
+        if i > self._start and event_ns < self._ts[i - 1]:
+            self._last_late = i
+        codes = {
+            "_country": intern_code(country),
+            "_merchant": intern_code(merchant_id),
+            "_device": intern_code(device_id),
+        }
+        self._ts[i] = event_ns
+        self._amount[i] = amount
+        for name, code in codes.items():
+            getattr(self, name)[i] = code
+        self._end = i + 1
+        for agg in self._windows.values():
+            agg.add(amount, codes)
+        
+        # Home country: the new entry can only take over the top spot
+        counts = self.country_counts
+        country_code = codes["_country"]
+        n = counts[country_code] = counts.get(country_code, 0) + 1
+        if self._home_id is None or n > counts[self._home_id]:
+            self._home_id = country_code
+        
+        if self._end - self._start > HISTORY_MAXLEN:
+            self._drop_oldest()
+        
+        self.known_merchants.add(codes["_merchant"])
         
         # Update "last" trackers
-        self.last_txn_time = txn.event_time
-        self.last_country = txn.country
-        self.last_device = txn.device_id
+        self.last_txn_time = event_time
+        self.last_txn_ns = event_ns
+        self.last_country = country
+        self.last_device = device_id
+    
+    def _make_room(self) -> None:
+        """Move the live slice to the front, doubling the arrays if over half full."""
+        n = len(self)
+        capacity = self._ts.size
+        grow = 2 * n > capacity
+        for name in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.empty(2 * capacity, dtype=old.dtype) if grow else old
+            new[:n] = old[self._start:self._end]
+            setattr(self, name, new)
+        for agg in self._windows.values():
+            agg.head -= self._start
+        self._last_late -= self._start
+        self._start, self._end = 0, n
     
-    def get_transactions_since(self, since: datetime) -> List[Transaction]:
-        """Get all transactions after a certain time."""
-        return [t for t in self.transactions if t.event_time >= since]
+    def drop_before(self, cutoff: datetime) -> None:
+        """
+        Forget transactions with event_time before cutoff.
+        
+        Drops from the head in insertion order, like the window eviction,
+        so the work is proportional to the number of entries dropped.
+        """
+        for _ in range(self._first_at_or_after(to_ns(cutoff)) - self._start):
+            self._drop_oldest()
+    
+    def _drop_oldest(self) -> None:
+        """Remove the oldest entry from the history and everything counting it."""
+        i = self._start
+        # Any window still holding the entry lets go of it too
+        for agg in self._windows.values():
+            if agg.head == i:
+                self._evict(agg)
+        
+        counts = self.country_counts
+        country_code = int(self._country[i])
+        left = counts[country_code] - 1
+        if left:
+            counts[country_code] = left
+        else:
+            del counts[country_code]
+        # Only losing an entry of the home country can change the top spot
+        if country_code == self._home_id:
+            self._home_id = max(counts, key=counts.get) if counts else None
+        
+        self._start = i + 1
+    
+    def _evict(self, agg: SlidingAggregator) -> None:
+        """Remove the entry at agg.head from agg and move the head past it."""
+        i = agg.head
+        agg.remove(
+            float(self._amount[i]),
+            {name: int(getattr(self, name)[i]) for name in agg.code_counts},
+        )
+        agg.head = i + 1
+    
+    def _first_at_or_after(self, cutoff_ns: int) -> int:
+        """
+        Index of the first live entry, in insertion order, at or after
+        cutoff_ns: where a window (or cleanup) evicting from the head stops.
+        """
+        ts = self._ts[self._start:self._end]
+        if self._last_late < self._start:
+            # Sorted by time: binary search
+            return self._start + int(np.searchsorted(ts, cutoff_ns, side="left"))
+        in_window = ts >= cutoff_ns
+        if not in_window.any():
+            return self._end
+        return self._start + int(in_window.argmax())
+    
+    def _window(self, window_ns: int, now_ns: int) -> SlidingAggregator:
+        """The aggregates for the last window_ns nanoseconds, advanced to now_ns."""
+        agg = self._windows.get(window_ns)
+        if agg is None:
+            # Seed from the entries already in the window
+            head = self._first_at_or_after(now_ns - window_ns)
+            agg = self._windows[window_ns] = SlidingAggregator(window_ns, head)
+            amounts = self._amount[head:self._end]
+            n = amounts.size
+            if n:
+                total = float(amounts.sum())
+                mean = total / n
+                # Squared deviations from the mean as one dot product
+                centered = amounts - mean
+                agg.count = n
+                agg.amount_sum = total
+                agg.amount_mean = mean
+                agg.amount_m2 = float(centered @ centered)
+            return agg
+        
+        cutoff = now_ns - window_ns
+        ts = self._ts
+        while agg.head < self._end and ts[agg.head] < cutoff:
+            self._evict(agg)
+        return agg
+    
+    def _count_unique(self, agg: SlidingAggregator, name: str) -> int:
+        counts = agg.code_counts.get(name)
+        if counts is None:
+            counts = agg.code_counts[name] = Counter(
+                getattr(self, name)[agg.head:self._end].tolist()
+            )
+        # -1 marks a missing value (no device)
+        return len(counts) - (-1 in counts)
+    
+    def compute_all(
+        self,
+        now_ns: int,
+        windows_ns: Tuple[int, ...] = (_NS_PER_HOUR, 24 * _NS_PER_HOUR, 168 * _NS_PER_HOUR),
+        unique_window_ns: int = 24 * _NS_PER_HOUR,
+        stat_window_ns: int = 30 * 24 * _NS_PER_HOUR,
+    ) -> Dict[str, Any]:
+        """
+        Every history statistic the feature calculator needs, in one call.
+        
+        now_ns is the current time as to_ns() nanoseconds and the window
+        lengths are in nanoseconds (see hours_to_ns); every window is
+        advanced to now_ns once, with integer cutoffs only.
+        
+        Returns:
+            Dict with "count" and "amount_sum" ({window_ns: value} for
+            each of `windows_ns`), "unique_countries", "unique_merchants"
+            and "unique_devices" over `unique_window_ns`, and
+            "amount_mean"/"amount_std" over `stat_window_ns` (None with
+            fewer than 2 transactions)
+        """
+        counts = {}
+        sums = {}
+        for window_ns in windows_ns:
+            agg = self._window(window_ns, now_ns)
+            counts[window_ns] = agg.count
+            sums[window_ns] = agg.amount_sum
+        
+        agg = self._window(unique_window_ns, now_ns)
+        mean, std = self._window(stat_window_ns, now_ns).amount_stats()
+        return {
+            "count": counts,
+            "amount_sum": sums,
+            "unique_countries": self._count_unique(agg, "_country"),
+            "unique_merchants": self._count_unique(agg, "_merchant"),
+            "unique_devices": self._count_unique(agg, "_device"),
+            "amount_mean": mean,
+            "amount_std": std,
+        }
     
     def get_transaction_count(self, hours: int, current_time: datetime) -> int:
         """Count transactions in the last N hours."""
-        cutoff = current_time - timedelta(hours=hours)
-        return len([t for t in self.transactions if t.event_time >= cutoff])
+        return self._window(hours_to_ns(hours), to_ns(current_time)).count
     
     def get_amount_sum(self, hours: int, current_time: datetime) -> float:
         """Sum of amounts in the last N hours."""
-        cutoff = current_time - timedelta(hours=hours)
-        return sum(t.amount for t in self.transactions if t.event_time >= cutoff)
+        return self._window(hours_to_ns(hours), to_ns(current_time)).amount_sum
     
     def get_unique_countries(self, hours: int, current_time: datetime) -> int:
         """Count unique countries in the last N hours."""
-        cutoff = current_time - timedelta(hours=hours)
-        countries = {t.country for t in self.transactions if t.event_time >= cutoff}
-        return len(countries)
+        return self._count_unique(self._window(hours_to_ns(hours), to_ns(current_time)), "_country")
     
     def get_unique_merchants(self, hours: int, current_time: datetime) -> int:
         """Count unique merchants in the last N hours."""
-        cutoff = current_time - timedelta(hours=hours)
-        merchants = {t.merchant_id for t in self.transactions if t.event_time >= cutoff}
-        return len(merchants)
+        return self._count_unique(self._window(hours_to_ns(hours), to_ns(current_time)), "_merchant")
     
     def get_unique_devices(self, hours: int, current_time: datetime) -> int:
-        """Count unique devices in the last N hours."""
-        cutoff = current_time - timedelta(hours=hours)
-        devices = {t.device_id for t in self.transactions 
-                   if t.event_time >= cutoff and t.device_id is not None}
-        return len(devices)
+        """Count unique devices in the last N hours (transactions without one don't count)."""
+        return self._count_unique(self._window(hours_to_ns(hours), to_ns(current_time)), "_device")
     
     def get_amount_stats(self, days: int, current_time: datetime) -> tuple:
         """
         Calculate mean and standard deviation of amounts over N days.
         Returns (mean, std_dev) or (None, None) if not enough data.
         """
-        cutoff = current_time - timedelta(days=days)
-        amounts = [t.amount for t in self.transactions if t.event_time >= cutoff]
-        
-        if len(amounts) < 2:
-            return None, None
-        
-        mean = sum(amounts) / len(amounts)
-        variance = sum((x - mean) ** 2 for x in amounts) / len(amounts)
-        std_dev = variance ** 0.5
-        
-        return mean, std_dev
+        return self._window(hours_to_ns(days * 24), to_ns(current_time)).amount_stats()
     
     def is_merchant_first_time(self, merchant_id: str) -> bool:
         """Check if this is the first time user visits this merchant."""
-        return merchant_id not in self.known_merchants
+        # No code yet means nobody has visited it (don't intern on lookup)
+        code = -1 if merchant_id is None else _codes.get(merchant_id)
+        return code not in self.known_merchants
 
 
 class StateStore:
     """
     The main state store that holds history for ALL users.
     
-    Thread-safe: Uses a lock for concurrent access.
-    Memory-bounded: Limits total users to prevent memory exhaustion.
+    Thread-safe: Users are split over NUM_SHARDS dicts by hash(user_id),
+    each with its own lock, so threads working on different users rarely
+    wait for each other.
+    Memory-bounded: Limits total users to prevent memory exhaustion
+    (max_users is split evenly over the shards).
     
     USAGE:
     ------
@@ -185,25 +513,35 @@ class StateStore:
         count_1h = user_state.get_transaction_count(hours=1, current_time=now)
     """
     
-    def __init__(self, max_users: int = 100_000, cleanup_interval_minutes: int = 10):
+    def __init__(
+        self,
+        max_users: int = 100_000,
+        cleanup_interval_minutes: int = 10,
+        num_shards: int = NUM_SHARDS,
+    ):
         """
         Initialize the state store.
         
         Args:
             max_users: Maximum number of users to track (prevents memory issues)
             cleanup_interval_minutes: How often to clean up old data
+            num_shards: Number of lock stripes
         """
         self.max_users = max_users
         self.cleanup_interval = timedelta(minutes=cleanup_interval_minutes)
         
-        # Dictionary mapping user_id -> UserState
-        self._users: Dict[str, UserState] = {}
-        
-        # Thread safety
-        self._lock = threading.RLock()
+        # (lock, user_id -> UserState, activity heap) per shard. The heap
+        # holds (last_txn_ns, user_id) pushed on every transaction; entries
+        # a user has since moved past are skipped when popped
+        self._shards: List[Tuple[threading.RLock, Dict[str, UserState], List[Tuple[int, str]]]] = [
+            (threading.RLock(), {}, []) for _ in range(num_shards)
+        ]
+        self._max_users_per_shard = max(1, -(-max_users // num_shards))
+        self._evict_per_shard = max(1, 1000 // num_shards)
         
-        # Track when we last cleaned up
+        # Track when we last cleaned up; only one thread runs a cleanup
         self._last_cleanup = datetime.now(timezone.utc)
+        self._cleanup_lock = threading.Lock()
         
         log.info("StateStore initialized: max_users=%d", max_users)
     
@@ -217,15 +555,17 @@ class StateStore:
         Returns:
             UserState object for this user
         """
-        with self._lock:
-            if user_id not in self._users:
-                # Check if we need to evict old users
-                if len(self._users) >= self.max_users:
-                    self._evict_oldest_users(count=1000)
+        lock, users, heap = self._shards[hash(user_id) % len(self._shards)]
+        with lock:
+            user_state = users.get(user_id)
+            if user_state is None:
+                # Check if we need to evict old users (from this shard only)
+                if len(users) >= self._max_users_per_shard:
+                    self._evict_oldest_users(users, heap, count=self._evict_per_shard)
                 
-                self._users[user_id] = UserState()
+                user_state = users[user_id] = UserState()
             
-            return self._users[user_id]
+            return user_state
     
     def add_transaction(self, user_id: str, txn_data: dict) -> UserState:
         """
@@ -237,23 +577,33 @@ class StateStore:
             user_id: User identifier
             txn_data: Transaction data dict with keys:
                       transaction_id, amount, event_time, country,
-                      merchant_id, channel, device_id
+                      merchant_id, channel, device_id (and optionally
+                      event_ns, event_time as to_ns() nanoseconds)
         
         Returns:
             UserState with the transaction added
         """
-        txn = Transaction(
-            transaction_id=txn_data["transaction_id"],
-            amount=float(txn_data["amount"]),
-            event_time=txn_data["event_time"],
-            country=txn_data["country"],
-            merchant_id=txn_data["merchant_id"],
-            channel=txn_data["channel"],
-            device_id=txn_data.get("device_id"),
+        # Straight into the history columns; no per-event Transaction object
+        user_state = self.get_or_create_user(user_id)
+        user_state.append(
+            txn_data["event_time"],
+            float(txn_data["amount"]),
+            txn_data["country"],
+            txn_data["merchant_id"],
+            txn_data.get("device_id"),
+            txn_data.get("event_ns"),
         )
         
-        user_state = self.get_or_create_user(user_id)
-        user_state.add_transaction(txn)
+        lock, users, heap = self._shards[hash(user_id) % len(self._shards)]
+        with lock:
+            heapq.heappush(heap, (user_state.last_txn_ns, user_id))
+            # Mostly stale entries: rebuild from the users' current times
+            if len(heap) > 2 * len(users) + 64:
+                heap[:] = [
+                    (state.last_txn_ns, uid) for uid, state in users.items()
+                    if state.last_txn_ns is not None
+                ]
+                heapq.heapify(heap)
         
         # Periodic cleanup
         self._maybe_cleanup()
@@ -262,30 +612,35 @@ class StateStore:
     
     def get_user_count(self) -> int:
         """Get the number of users currently being tracked."""
-        with self._lock:
-            return len(self._users)
+        total = 0
+        for lock, users, _ in self._shards:
+            with lock:
+                total += len(users)
+        return total
     
-    def _evict_oldest_users(self, count: int = 1000) -> None:
+    def _evict_oldest_users(
+        self,
+        users: Dict[str, UserState],
+        heap: List[Tuple[int, str]],
+        count: int,
+    ) -> None:
         """
-        Remove users with oldest last transaction time.
-        Called when we hit max_users limit.
+        Remove the users of one shard with the oldest last transaction time.
+        Called, under the shard's lock, when the shard hits its share of
+        max_users.
         """
-        with self._lock:
-            # Find users with oldest last_txn_time
-            users_by_time = []
-            for user_id, state in self._users.items():
-                if state.last_txn_time:
-                    users_by_time.append((state.last_txn_time, user_id))
-            
-            # Sort by time (oldest first)
-            users_by_time.sort()
-            
-            # Remove oldest N users
-            for _, user_id in users_by_time[:count]:
-                del self._users[user_id]
-            
-            log.info("Evicted %d oldest users. Remaining: %d", 
-                     min(count, len(users_by_time)), len(self._users))
+        # Pop oldest first, skipping entries for users that are gone or
+        # have transacted since
+        evicted = 0
+        while heap and evicted < count:
+            txn_ns, user_id = heapq.heappop(heap)
+            state = users.get(user_id)
+            if state is not None and state.last_txn_ns == txn_ns:
+                del users[user_id]
+                evicted += 1
+        
+        log.info("Evicted %d oldest users from shard. Remaining in shard: %d",
+                 evicted, len(users))
     
     def _maybe_cleanup(self) -> None:
         """Periodically clean up old transactions from user histories."""
@@ -294,27 +649,34 @@ class StateStore:
         if now - self._last_cleanup < self.cleanup_interval:
             return
         
-        with self._lock:
+        # Another thread is already cleaning up
+        if not self._cleanup_lock.acquire(blocking=False):
+            return
+        try:
+            if now - self._last_cleanup < self.cleanup_interval:
+                return
             self._last_cleanup = now
             cutoff = now - timedelta(days=7)
             
-            # For each user, remove transactions older than 7 days
-            users_to_remove = []
-            for user_id, state in self._users.items():
-                # Filter out old transactions
-                old_count = len(state.transactions)
-                state.transactions = deque(
-                    (t for t in state.transactions if t.event_time >= cutoff),
-                    maxlen=500
-                )
-                
-                # If user has no recent activity, mark for removal
-                if len(state.transactions) == 0:
-                    users_to_remove.append(user_id)
-            
-            # Remove inactive users
-            for user_id in users_to_remove:
-                del self._users[user_id]
+            # One shard at a time, so other shards stay available
+            removed = 0
+            for lock, users, _ in self._shards:
+                with lock:
+                    # For each user, remove transactions older than 7 days
+                    users_to_remove = []
+                    for user_id, state in users.items():
+                        state.drop_before(cutoff)
+                        
+                        # If user has no recent activity, mark for removal
+                        if len(state) == 0:
+                            users_to_remove.append(user_id)
+                    
+                    # Remove inactive users
+                    for user_id in users_to_remove:
+                        del users[user_id]
+                    removed += len(users_to_remove)
             
-            if users_to_remove:
-                log.info("Cleanup: removed %d inactive users", len(users_to_remove))
+            if removed:
+                log.info("Cleanup: removed %d inactive users", removed)
+        finally:
+            self._cleanup_lock.release()
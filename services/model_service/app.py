@@ -27,12 +27,14 @@ FLOW:
 
 import logging
 import sys
+import threading
 import time
+from collections import deque
 from datetime import datetime, timezone
-from typing import List, Optional
+from functools import lru_cache
+from typing import Deque, List, Optional, Tuple
 from contextlib import asynccontextmanager
 
-import pandas as pd
 import numpy as np
 from fastapi import FastAPI, HTTPException, status, Response
 from fastapi.middleware.cors import CORSMiddleware
@@ -40,7 +42,8 @@ from fastapi.middleware.cors import CORSMiddleware
 # Prometheus metrics
 from prometheus_client import (
     Counter, Gauge, Histogram, Info,
-    generate_latest, CONTENT_TYPE_LATEST
+    generate_latest, CONTENT_TYPE_LATEST,
+    disable_created_metrics,
 )
 
 from config import config
@@ -52,9 +55,16 @@ from schemas import (
     FeatureContribution,
     AlertResponse,
 )
-from model_loader import model_loader
-from explainer import get_feature_contributions, get_risk_factors
-from alert_writer import create_alert, check_connection, get_recent_alerts, get_alert_stats
+from model_loader import model_loader, predict_batcher
+from explainer import FEATURE_ORDER, FEATURE_INDEX, get_feature_contributions, get_risk_factors
+from alert_writer import (
+    alert_batcher,
+    create_alert,
+    check_connection,
+    close_pool,
+    get_recent_alerts,
+    get_alert_stats,
+)
 
 # Setup logging
 logging.basicConfig(
@@ -65,6 +75,10 @@ logging.basicConfig(
 log = logging.getLogger("model_service")
 
 
+# Skip the per-child *_created samples; nothing consumes them and they add
+# a line per counter/histogram child to every scrape
+disable_created_metrics()
+
 # ============================================================================
 # PROMETHEUS METRICS
 # ============================================================================
@@ -84,12 +98,12 @@ SCORING_DECISIONS = Counter(
 SCORING_LATENCY = Histogram(
     'fraud_scoring_latency_seconds',
     'End-to-end scoring latency',
-    buckets=[0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0]
+    buckets=[0.01, 0.05, 0.1, 0.25, 1.0]
 )
 
 ALERTS_CREATED = Counter(
     'fraud_alerts_created_total',
-    'Total alerts created',
+    'Total alerts queued for writing (minus fraud_alerts_lost_total = written)',
     ['decision']
 )
 
@@ -115,24 +129,93 @@ SCORE_MAX = Gauge(
 )
 
 
+# Labelled children, memoized so the scoring path skips .labels()
+@lru_cache(maxsize=None)
+def scoring_requests(status: str) -> Counter:
+    return SCORING_REQUESTS.labels(status=status)
+
+
+@lru_cache(maxsize=None)
+def scoring_decisions(decision: str) -> Counter:
+    return SCORING_DECISIONS.labels(decision=decision)
+
+
+@lru_cache(maxsize=None)
+def alerts_created(decision: str) -> Counter:
+    return ALERTS_CREATED.labels(decision=decision)
+
+
 class RollingScoreTracker:
-    """Track rolling statistics of fraud scores."""
+    """
+    Track rolling statistics of fraud scores.
     
-    def __init__(self, window_size: int = 100):
+    State is guarded by a single lock so concurrent scorers can share one
+    tracker. The gauges are only refreshed every `flush_every` scores to
+    keep Prometheus writes off most scoring calls.
+    """
+    
+    def __init__(self, window_size: int = 100, flush_every: int = 16):
         self.window_size = window_size
-        self.scores: list = []
+        self.flush_every = flush_every
+        self.scores: Deque[float] = deque(maxlen=window_size)
+        self._sum: float = 0.0
+        # (index, score) pairs with strictly decreasing scores; the head
+        # is always the max of the current window
+        self._max_dq: Deque[Tuple[int, float]] = deque()
+        self._idx: int = 0
+        self._since_flush: int = 0
+        self._lock = threading.Lock()
     
     def add(self, score: float):
-        self.scores.append(score)
-        if len(self.scores) > self.window_size:
-            self.scores.pop(0)
+        with self._lock:
+            # deque drops the oldest score on append once full, so take it
+            # out of the running sum first
+            if len(self.scores) == self.window_size:
+                self._sum -= self.scores[0]
+            self.scores.append(score)
+            self._sum += score
+            
+            # Monotonic deque: drop smaller scores that can never be the max
+            # again, then expire the head once it falls out of the window
+            while self._max_dq and self._max_dq[-1][1] <= score:
+                self._max_dq.pop()
+            self._max_dq.append((self._idx, score))
+            if self._max_dq[0][0] <= self._idx - self.window_size:
+                self._max_dq.popleft()
+            self._idx += 1
+            
+            self._since_flush += 1
+            if self._since_flush < self.flush_every:
+                return
+            self._since_flush = 0
+            mean = self._sum / len(self.scores)
+            max_score = self._max_dq[0][1]
         
-        if self.scores:
-            SCORE_MEAN.set(sum(self.scores) / len(self.scores))
-            SCORE_MAX.set(max(self.scores))
+        SCORE_MEAN.set(mean)
+        SCORE_MAX.set(max_score)
+    
+    def flush(self):
+        """Push the current window statistics to the gauges immediately."""
+        with self._lock:
+            if not self.scores:
+                return
+            self._since_flush = 0
+            mean = self._sum / len(self.scores)
+            max_score = self._max_dq[0][1]
+        
+        SCORE_MEAN.set(mean)
+        SCORE_MAX.set(max_score)
 
 score_tracker = RollingScoreTracker()
 
+# Cached /metrics payload (see render_metrics)
+METRICS_CACHE_TTL_SECONDS = 1.0
+_metrics_cache = {"ts": 0.0, "body": b""}
+_metrics_cache_lock = threading.Lock()
+
+# The alert reads are cached server-side for the same time
+ALERTS_CACHE_CONTROL = f"max-age={int(config.scoring.alerts_cache_ttl_s)}"
+
 
 # ============================================================================
 # STARTUP / SHUTDOWN
@@ -149,7 +232,7 @@ async def lifespan(app: FastAPI):
     log.info(f"MLflow URI: {config.mlflow.tracking_uri}")
     log.info(f"Model: {config.mlflow.model_name} v{config.mlflow.model_version}")
     
-    success = model_loader.load()
+    success = model_loader.load(FEATURE_ORDER)
     if not success:
         log.error("Failed to load model! Service will return errors.")
         MODEL_LOADED.set(0)
@@ -162,11 +245,15 @@ async def lifespan(app: FastAPI):
         })
     
     # Check database
-    if check_connection():
+    if await check_connection():
         log.info("Database connection OK")
     else:
         log.warning("Database connection failed! Alerts will not be saved.")
     
+    # Background scorer and alert writer
+    await predict_batcher.start()
+    await alert_batcher.start()
+    
     log.info("=" * 60)
     log.info(f"Thresholds: REVIEW >= {config.scoring.threshold_review}, BLOCK >= {config.scoring.threshold_block}")
     log.info("=" * 60)
@@ -175,6 +262,11 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     log.info("Shutting down model service...")
+    
+    # Score requests and write alerts still queued
+    await predict_batcher.stop()
+    await alert_batcher.stop()
+    await close_pool()
 
 
 # ============================================================================
@@ -202,48 +294,90 @@ app.add_middleware(
 # HELPER FUNCTIONS
 # ============================================================================
 
-def prepare_features(request: ScoreRequest) -> pd.DataFrame:
+# Scoring settings read on every request (config is fixed at startup)
+_T_REVIEW = config.scoring.threshold_review
+_T_BLOCK = config.scoring.threshold_block
+_TOP_K = config.scoring.top_k_features
+
+# (UTC minute, time features) for current_time_features
+_time_bucket: Tuple[int, Tuple[int, int, bool, bool]] = (-1, (0, 0, False, False))
+
+
+def current_time_features() -> Tuple[int, int, bool, bool]:
+    """
+    (hour_of_day, day_of_week, is_weekend, is_night) for the current UTC time.
+    
+    They only change on minute boundaries, so they are derived once per
+    minute and reused until time.time() enters the next one.
+    """
+    global _time_bucket
+    minute = int(time.time()) // 60
+    if minute != _time_bucket[0]:
+        now = datetime.fromtimestamp(minute * 60, timezone.utc)
+        hour_of_day = now.hour
+        day_of_week = now.weekday()
+        _time_bucket = (minute, (hour_of_day, day_of_week, day_of_week >= 5, hour_of_day < 6))
+    return _time_bucket[1]
+
+
+def prepare_features(request: ScoreRequest) -> np.ndarray:
     """
     Prepare features for model scoring.
     
     Uses features from request if provided, otherwise uses defaults.
     In production, these would come from the feature store.
+    
+    Returns a (1, len(FEATURE_ORDER)) row, columns in FEATURE_ORDER.
     """
     # Channel encoding
     channel_map = {"POS": 0, "ECOM": 1, "ATM": 2}
     channel_encoded = channel_map.get(request.channel.upper(), 0)
     
     # Current time features
-    now = datetime.now(timezone.utc)
-    hour_of_day = now.hour
-    day_of_week = now.weekday()
-    is_weekend = day_of_week >= 5
-    is_night = hour_of_day < 6
+    hour_of_day, day_of_week, is_weekend, is_night = current_time_features()
     
-    # Build feature dict
-    features = {
-        "amount": request.amount,
-        "amount_zscore": request.amount_zscore if request.amount_zscore is not None else 0.0,
-        "user_avg_amount_30d": request.user_avg_amount_30d if request.user_avg_amount_30d is not None else request.amount,
-        "user_txn_count_1h": request.user_txn_count_1h if request.user_txn_count_1h is not None else 0,
-        "user_txn_count_24h": request.user_txn_count_24h if request.user_txn_count_24h is not None else 1,
-        "user_txn_count_7d": request.user_txn_count_7d if request.user_txn_count_7d is not None else 1,
-        "user_amount_sum_1h": request.user_amount_sum_1h if request.user_amount_sum_1h is not None else request.amount,
-        "user_amount_sum_24h": request.user_amount_sum_24h if request.user_amount_sum_24h is not None else request.amount,
-        "country_change_flag": 1 if request.country_change_flag else 0,
-        "device_change_flag": 1 if request.device_change_flag else 0,
-        "unique_countries_24h": request.unique_countries_24h if request.unique_countries_24h is not None else 1,
-        "unique_merchants_24h": request.unique_merchants_24h if request.unique_merchants_24h is not None else 1,
-        "user_merchant_first_time": 1 if request.user_merchant_first_time else 0,
-        "hour_of_day": hour_of_day,
-        "day_of_week": day_of_week,
-        "is_weekend": 1 if is_weekend else 0,
-        "is_night": 1 if is_night else 0,
-        "minutes_since_last_txn": request.minutes_since_last_txn if request.minutes_since_last_txn is not None else 60,
-        "channel_encoded": channel_encoded,
-    }
+    # Fill the row by column index
+    idx = FEATURE_INDEX
+    arr = np.empty((1, len(FEATURE_ORDER)), dtype=np.float64)
+    row = arr[0]
+    row[idx["amount"]] = request.amount
+    row[idx["amount_zscore"]] = request.amount_zscore if request.amount_zscore is not None else 0.0
+    row[idx["user_avg_amount_30d"]] = request.user_avg_amount_30d if request.user_avg_amount_30d is not None else request.amount
+    row[idx["user_txn_count_1h"]] = request.user_txn_count_1h if request.user_txn_count_1h is not None else 0
+    row[idx["user_txn_count_24h"]] = request.user_txn_count_24h if request.user_txn_count_24h is not None else 1
+    row[idx["user_txn_count_7d"]] = request.user_txn_count_7d if request.user_txn_count_7d is not None else 1
+    row[idx["user_amount_sum_1h"]] = request.user_amount_sum_1h if request.user_amount_sum_1h is not None else request.amount
+    row[idx["user_amount_sum_24h"]] = request.user_amount_sum_24h if request.user_amount_sum_24h is not None else request.amount
+    row[idx["country_change_flag"]] = 1 if request.country_change_flag else 0
+    row[idx["device_change_flag"]] = 1 if request.device_change_flag else 0
+    row[idx["unique_countries_24h"]] = request.unique_countries_24h if request.unique_countries_24h is not None else 1
+    row[idx["unique_merchants_24h"]] = request.unique_merchants_24h if request.unique_merchants_24h is not None else 1
+    row[idx["user_merchant_first_time"]] = 1 if request.user_merchant_first_time else 0
+    row[idx["hour_of_day"]] = hour_of_day
+    row[idx["day_of_week"]] = day_of_week
+    row[idx["is_weekend"]] = 1 if is_weekend else 0
+    row[idx["is_night"]] = 1 if is_night else 0
+    row[idx["minutes_since_last_txn"]] = request.minutes_since_last_txn if request.minutes_since_last_txn is not None else 60
+    row[idx["channel_encoded"]] = channel_encoded
+    
+    return arr
+
+
+def render_metrics() -> bytes:
+    """
+    Serialize the registry, reusing the last output for METRICS_CACHE_TTL_SECONDS.
     
-    return pd.DataFrame([features])
+    Concurrent scrapes wait on the lock and get the same bytes instead of
+    each walking the registry.
+    """
+    with _metrics_cache_lock:
+        now = time.monotonic()
+        if now - _metrics_cache["ts"] >= METRICS_CACHE_TTL_SECONDS:
+            # Score gauges are batched; make sure the scrape sees the latest window
+            score_tracker.flush()
+            _metrics_cache["body"] = generate_latest()
+            _metrics_cache["ts"] = now
+        return _metrics_cache["body"]
 
 
 def make_decision(score: float) -> Decision:
@@ -254,9 +388,9 @@ def make_decision(score: float) -> Decision:
     threshold_review <= score < threshold_block → REVIEW
     score >= threshold_block      → BLOCK
     """
-    if score >= config.scoring.threshold_block:
+    if score >= _T_BLOCK:
         return Decision.BLOCK
-    elif score >= config.scoring.threshold_review:
+    elif score >= _T_REVIEW:
         return Decision.REVIEW
     else:
         return Decision.APPROVE
@@ -270,7 +404,7 @@ def make_decision(score: float) -> Decision:
 async def metrics():
     """Prometheus metrics endpoint."""
     return Response(
-        content=generate_latest(),
+        content=render_metrics(),
         media_type=CONTENT_TYPE_LATEST
     )
 
@@ -287,7 +421,7 @@ async def health_check():
         model_loaded=model_loader.is_loaded(),
         model_name=model_loader.model_name,
         model_version=model_loader.model_version,
-        database_connected=check_connection(),
+        database_connected=await check_connection(),
     )
 
 
@@ -306,7 +440,7 @@ async def score_transaction(request: ScoreRequest):
     
     # Check if model is loaded
     if not model_loader.is_loaded():
-        SCORING_REQUESTS.labels(status='error').inc()
+        scoring_requests('error').inc()
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Model not loaded. Please try again later."
@@ -314,11 +448,10 @@ async def score_transaction(request: ScoreRequest):
     
     try:
         # Prepare features
-        features_df = prepare_features(request)
+        features = prepare_features(request)
         
-        # Score
-        scores = model_loader.predict_proba(features_df)
-        score = float(scores[0])
+        # Score (batched with concurrent requests)
+        score = await predict_batcher.submit(features)
         
         # Track score for monitoring
         score_tracker.add(score)
@@ -332,62 +465,62 @@ async def score_transaction(request: ScoreRequest):
         
         # Record metrics
         SCORING_LATENCY.observe(latency_seconds)
-        SCORING_REQUESTS.labels(status='success').inc()
-        SCORING_DECISIONS.labels(decision=decision.value).inc()
+        scoring_requests('success').inc()
+        scoring_decisions(decision.value).inc()
         
         # Get explanations
-        feature_importances = model_loader.get_feature_importances()
-        features_series = features_df.iloc[0]
+        imp_names, imp_index, imp_values = model_loader.get_importance_arrays()
+        features_row = features[0]
         
         top_features = get_feature_contributions(
-            features_series,
-            feature_importances,
-            top_k=config.scoring.top_k_features
+            features_row,
+            imp_names,
+            imp_index,
+            imp_values,
+            top_k=_TOP_K
         )
         
         risk_factors = get_risk_factors(
-            features_series,
+            features_row,
             score,
-            config.scoring.threshold_review
+            _T_REVIEW
         )
         
-        # Create alert if REVIEW or BLOCK
-        alert_id = None
+        # Create alert if REVIEW or BLOCK (queued; written in the background)
         alert_created = False
         
         if decision in [Decision.REVIEW, Decision.BLOCK] and config.scoring.create_alerts:
-            alert_id = create_alert(
+            alert_created = await create_alert(
                 transaction_id=request.transaction_id,
                 user_id=request.user_id,
                 amount=request.amount,
                 channel=request.channel,
                 country=request.country,
                 score=score,
-                threshold=config.scoring.threshold_review if decision == Decision.REVIEW else config.scoring.threshold_block,
+                threshold=_T_REVIEW if decision == Decision.REVIEW else _T_BLOCK,
                 decision=decision.value,
                 top_features=top_features,
                 model_name=model_loader.model_name,
                 model_version=model_loader.model_version,
                 latency_ms=latency_ms,
             )
-            alert_created = alert_id is not None
             
             if alert_created:
-                ALERTS_CREATED.labels(decision=decision.value).inc()
+                alerts_created(decision.value).inc()
         
         # Log
         log.info(
             f"Scored: txn={request.transaction_id[:8]}... "
             f"score={score:.4f} decision={decision.value} "
-            f"latency={latency_ms}ms alert_id={alert_id}"
+            f"latency={latency_ms}ms alert_created={alert_created}"
         )
         
         return ScoreResponse(
             transaction_id=request.transaction_id,
             score=round(score, 4),
             decision=decision,
-            threshold_review=config.scoring.threshold_review,
-            threshold_block=config.scoring.threshold_block,
+            threshold_review=_T_REVIEW,
+            threshold_block=_T_BLOCK,
             top_features=top_features,
             risk_factors=risk_factors,
             model_name=model_loader.model_name,
@@ -395,11 +528,10 @@ async def score_transaction(request: ScoreRequest):
             scored_at=datetime.now(timezone.utc),
             latency_ms=latency_ms,
             alert_created=alert_created,
-            alert_id=alert_id,
         )
         
     except Exception as e:
-        SCORING_REQUESTS.labels(status='error').inc()
+        scoring_requests('error').inc()
         log.exception(f"Error scoring transaction: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -408,16 +540,18 @@ async def score_transaction(request: ScoreRequest):
 
 
 @app.get("/alerts")
-async def get_alerts(limit: int = 20):
-    """Get recent alerts."""
-    alerts = get_recent_alerts(limit)
+async def get_alerts(response: Response, limit: int = 20, feature: Optional[str] = None):
+    """Get recent alerts, optionally only those with `feature` among their top features."""
+    response.headers["Cache-Control"] = ALERTS_CACHE_CONTROL
+    alerts = await get_recent_alerts(limit, feature)
     return {"alerts": alerts, "count": len(alerts)}
 
 
 @app.get("/alerts/stats")
-async def get_stats():
-    """Get alert statistics."""
-    stats = get_alert_stats()
+async def get_stats(response: Response, feature: Optional[str] = None):
+    """Get alert statistics, optionally only for alerts with `feature` among their top features."""
+    response.headers["Cache-Control"] = ALERTS_CACHE_CONTROL
+    stats = await get_alert_stats(feature)
     return stats
 
 
@@ -21,6 +21,11 @@ class DatabaseConfig:
     user: str = os.getenv("PGUSER", "fraud")
     password: str = os.getenv("PGPASSWORD", "fraud")
     
+    # Bounds of the shared asyncpg pool (alert writer and read endpoints
+    # borrow from it concurrently)
+    pool_min_conn: int = int(os.getenv("DB_POOL_MIN", "2"))
+    pool_max_conn: int = int(os.getenv("DB_POOL_MAX", str(2 * (os.cpu_count() or 1))))
+    
     @property
     def connection_string(self) -> str:
         return f"host={self.host} port={self.port} dbname={self.database} user={self.user} password={self.password}"
@@ -47,6 +52,23 @@ class ScoringConfig:
     
     # Whether to create alerts for REVIEW and BLOCK decisions
     create_alerts: bool = os.getenv("CREATE_ALERTS", "true").lower() == "true"
+    
+    # Alerts are queued and written in batches: up to alert_batch_size rows,
+    # or whatever arrived within alert_flush_ms of the first. Alerts beyond
+    # alert_queue_size waiting to be written are dropped (and logged).
+    alert_batch_size: int = int(os.getenv("ALERT_BATCH_SIZE", "1000"))
+    alert_flush_ms: int = int(os.getenv("ALERT_FLUSH_MS", "50"))
+    alert_queue_size: int = int(os.getenv("ALERT_QUEUE_SIZE", "10000"))
+    
+    # /alerts and /alerts/stats results are reused for up to this long
+    # (or until new alerts are written); 0 disables the cache
+    alerts_cache_ttl_s: float = float(os.getenv("ALERTS_CACHE_TTL_SECONDS", "5"))
+    
+    # Concurrent /score requests are scored together: up to
+    # predict_batch_size rows, or whatever arrived within
+    # predict_batch_delay_ms of the first (0 = only what is already waiting)
+    predict_batch_size: int = int(os.getenv("PREDICT_BATCH_SIZE", "256"))
+    predict_batch_delay_ms: float = float(os.getenv("PREDICT_BATCH_DELAY_MS", "3"))
 
 
 @dataclass
@@ -12,13 +12,49 @@ weighted by how unusual each feature value is.
 import logging
 from typing import List, Dict, Any
 import numpy as np
-import pandas as pd
 
 from schemas import FeatureContribution
 
 log = logging.getLogger("model_service.explainer")
 
 
+# Column order of the feature rows scored and explained here (the model
+# loader maps these onto the model's own feature order)
+FEATURE_ORDER = [
+    "amount",
+    "amount_zscore",
+    "user_avg_amount_30d",
+    "user_txn_count_1h",
+    "user_txn_count_24h",
+    "user_txn_count_7d",
+    "user_amount_sum_1h",
+    "user_amount_sum_24h",
+    "country_change_flag",
+    "device_change_flag",
+    "unique_countries_24h",
+    "unique_merchants_24h",
+    "user_merchant_first_time",
+    "hour_of_day",
+    "day_of_week",
+    "is_weekend",
+    "is_night",
+    "minutes_since_last_txn",
+    "channel_encoded",
+]
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_ORDER)}
+
+# Row positions read by get_risk_factors
+_AMOUNT = FEATURE_INDEX["amount"]
+_AMOUNT_ZSCORE = FEATURE_INDEX["amount_zscore"]
+_TXN_COUNT_1H = FEATURE_INDEX["user_txn_count_1h"]
+_COUNTRY_CHANGE = FEATURE_INDEX["country_change_flag"]
+_DEVICE_CHANGE = FEATURE_INDEX["device_change_flag"]
+_UNIQUE_COUNTRIES_24H = FEATURE_INDEX["unique_countries_24h"]
+_MERCHANT_FIRST_TIME = FEATURE_INDEX["user_merchant_first_time"]
+_IS_NIGHT = FEATURE_INDEX["is_night"]
+_MINUTES_SINCE_LAST = FEATURE_INDEX["minutes_since_last_txn"]
+_CHANNEL = FEATURE_INDEX["channel_encoded"]
+
 # Human-readable descriptions for features
 FEATURE_DESCRIPTIONS = {
     "amount": "Transaction amount",
@@ -44,8 +80,10 @@ FEATURE_DESCRIPTIONS = {
 
 
 def get_feature_contributions(
-    features: pd.Series,
-    feature_importances: Dict[str, float],
+    features: np.ndarray,
+    imp_names: np.ndarray,
+    imp_index: np.ndarray,
+    imp_values: np.ndarray,
     top_k: int = 5
 ) -> List[FeatureContribution]:
     """
@@ -57,46 +95,48 @@ def get_feature_contributions(
     This isn't as accurate as SHAP but is much faster for real-time scoring.
     
     Args:
-        features: Feature values for this transaction (Series)
-        feature_importances: Model's feature importances (dict)
+        features: Feature values for this transaction (1-D row)
+        imp_names: Names of the features that have an importance
+        imp_index: Their positions in the row
+        imp_values: Their importances
         top_k: Number of top features to return
     
     Returns:
         List of FeatureContribution objects
     """
-    contributions = []
+    if top_k <= 0 or len(imp_index) == 0:
+        return []
+    
+    values = features[imp_index]
+    
+    # Approximate contribution
+    # Simple heuristic: higher absolute values contribute more (zero values
+    # contribute nothing, binary flags contribute their importance if set)
+    # In a real system, you'd normalize by training data statistics
+    scaled = np.minimum(np.abs(values) / 100, 1.0).astype(imp_values.dtype)
+    contrib = np.round(imp_values * scaled, 4)
+    
+    # Top K by contribution (descending). Ties keep feature order, so take
+    # everything tied with the K-th value before sorting.
+    if top_k < len(contrib):
+        kth = contrib[np.argpartition(-contrib, top_k - 1)[top_k - 1]]
+        candidates = np.flatnonzero(contrib >= kth)
+    else:
+        candidates = np.arange(len(contrib))
+    top = candidates[np.argsort(-contrib[candidates], kind="stable")[:top_k]]
     
-    for feature_name, value in features.items():
-        if feature_name not in feature_importances:
-            continue
-        
-        importance = feature_importances[feature_name]
-        
-        # Approximate contribution
-        # For boolean/binary features, contribution = importance if value is 1
-        # For numeric features, we scale by how "extreme" the value is
-        if isinstance(value, bool):
-            contribution = importance if value else 0
-        elif value == 0:
-            contribution = 0
-        else:
-            # Simple heuristic: higher absolute values contribute more
-            # In a real system, you'd normalize by training data statistics
-            contribution = importance * min(abs(value) / 100, 1.0)
-        
-        # Generate description
-        description = generate_description(feature_name, value)
-        
+    contributions = []
+    for i in top.tolist():
+        feature_name = imp_names[i]
+        value = float(values[i])
         contributions.append(FeatureContribution(
             feature=feature_name,
-            value=float(value) if not isinstance(value, bool) else (1.0 if value else 0.0),
-            contribution=round(contribution, 4),
-            description=description
+            value=value,
+            contribution=round(float(contrib[i]), 4),
+            description=generate_description(feature_name, value)
         ))
     
-    # Sort by contribution (descending) and take top K
-    contributions.sort(key=lambda x: x.contribution, reverse=True)
-    return contributions[:top_k]
+    return contributions
 
 
 def generate_description(feature_name: str, value: Any) -> str:
@@ -170,7 +210,7 @@ def generate_description(feature_name: str, value: Any) -> str:
 
 
 def get_risk_factors(
-    features: pd.Series,
+    row: np.ndarray,
     score: float,
     threshold_review: float = 0.3
 ) -> List[str]:
@@ -178,59 +218,60 @@ def get_risk_factors(
     Generate human-readable risk factors.
     
     Args:
-        features: Feature values
+        row: Feature values (1-D row, columns in FEATURE_ORDER)
         score: Fraud probability score
         threshold_review: Threshold for concern
     
     Returns:
         List of risk factor strings
     """
-    risk_factors = []
+    risk_factors: List[str] = []
+    add = risk_factors.append
+    values = row.tolist()
     
     # Amount-based risks
-    amount = features.get("amount", 0)
+    amount = values[_AMOUNT]
     if amount > 2000:
-        risk_factors.append(f"High transaction amount (${amount:,.2f})")
+        add(f"High transaction amount (${amount:,.2f})")
     
-    zscore = features.get("amount_zscore")
-    if zscore and zscore > 3:
-        risk_factors.append(f"Amount is unusually high for this user ({zscore:.1f} std devs)")
+    zscore = values[_AMOUNT_ZSCORE]
+    if zscore > 3:
+        add(f"Amount is unusually high for this user ({zscore:.1f} std devs)")
     
     # Geographic risks
-    if features.get("country_change_flag"):
-        risk_factors.append("Different country from previous transaction")
+    if values[_COUNTRY_CHANGE]:
+        add("Different country from previous transaction")
     
-    countries_24h = features.get("unique_countries_24h", 1)
-    if countries_24h and countries_24h > 2:
-        risk_factors.append(f"Card used in {int(countries_24h)} countries in 24 hours")
+    countries_24h = values[_UNIQUE_COUNTRIES_24H]
+    if countries_24h > 2:
+        add(f"Card used in {int(countries_24h)} countries in 24 hours")
     
     # Velocity risks
-    txn_count_1h = features.get("user_txn_count_1h", 0)
-    if txn_count_1h and txn_count_1h > 5:
-        risk_factors.append(f"High transaction velocity ({int(txn_count_1h)} in last hour)")
+    txn_count_1h = values[_TXN_COUNT_1H]
+    if txn_count_1h > 5:
+        add(f"High transaction velocity ({int(txn_count_1h)} in last hour)")
     
-    mins_since_last = features.get("minutes_since_last_txn")
-    if mins_since_last is not None and mins_since_last < 5:
-        risk_factors.append(f"Rapid transaction ({int(mins_since_last)} minutes since last)")
+    mins_since_last = values[_MINUTES_SINCE_LAST]
+    if mins_since_last < 5:
+        add(f"Rapid transaction ({int(mins_since_last)} minutes since last)")
     
     # Device/merchant risks
-    if features.get("device_change_flag"):
-        risk_factors.append("New device detected")
+    if values[_DEVICE_CHANGE]:
+        add("New device detected")
     
-    if features.get("user_merchant_first_time"):
-        risk_factors.append("First transaction at this merchant")
+    if values[_MERCHANT_FIRST_TIME]:
+        add("First transaction at this merchant")
     
     # Channel risks
-    channel = features.get("channel_encoded")
-    if channel == 1:  # ECOM
-        risk_factors.append("Online transaction (card-not-present)")
+    if values[_CHANNEL] == 1:  # ECOM
+        add("Online transaction (card-not-present)")
     
     # Time-based risks
-    if features.get("is_night"):
-        risk_factors.append("Transaction during night hours (midnight-6am)")
+    if values[_IS_NIGHT]:
+        add("Transaction during night hours (midnight-6am)")
     
     # If no specific risks but high score
     if not risk_factors and score > threshold_review:
-        risk_factors.append("Multiple moderate risk factors combined")
+        add("Multiple moderate risk factors combined")
     
     return risk_factors
@@ -8,13 +8,13 @@ The model is loaded ONCE at startup for fast inference.
 ================================================================================
 """
 
+import asyncio
 import logging
-from typing import Optional, Tuple, Any
+from typing import Optional, Tuple, Any, List
 
 import mlflow
 import mlflow.pyfunc
 import numpy as np
-import pandas as pd
 
 from config import config
 
@@ -29,8 +29,8 @@ class ModelLoader:
         loader = ModelLoader()
         loader.load()
         
-        # Score a transaction
-        score = loader.predict(features_df)
+        # Score a transaction (rows in the column order given to load())
+        score = loader.predict_proba(features)
     """
     
     def __init__(self):
@@ -39,10 +39,27 @@ class ModelLoader:
         self.model_version: Optional[str] = None
         self.feature_names: Optional[list] = None
         
-    def load(self) -> bool:
+        # Set by load(): column selection from the caller's feature order
+        # into the model's (None = already in model order), and the booster
+        # scored directly when the model is XGBoost
+        self._columns: Optional[np.ndarray] = None
+        self._booster = None
+        self._iteration_range: Tuple[int, int] = (0, 0)
+        
+        # Feature importances, computed once by load(): names, their
+        # positions in the caller's rows, and the importance values
+        self._imp_names: np.ndarray = np.empty(0, dtype=object)
+        self._imp_index: np.ndarray = np.empty(0, dtype=np.intp)
+        self._imp_values: np.ndarray = np.empty(0, dtype=np.float32)
+        
+    def load(self, feature_order: Optional[List[str]] = None) -> bool:
         """
         Load model from MLflow.
         
+        Args:
+            feature_order: Column order of the rows that will be passed to
+                predict_proba (default: the model's own order)
+        
         Returns:
             True if model loaded successfully, False otherwise
         """
@@ -67,6 +84,17 @@ class ModelLoader:
             if self.feature_names:
                 log.info(f"Model expects {len(self.feature_names)} features: {self.feature_names}")
             
+            self._columns = self._map_columns(feature_order)
+            self._cache_importances(feature_order or self.feature_names or [])
+            
+            if hasattr(self.model, 'get_booster'):
+                # Score the booster directly; honour early stopping the way
+                # XGBClassifier.predict_proba does
+                self._booster = self.model.get_booster()
+                best_iteration = getattr(self.model, 'best_iteration', None)
+                if best_iteration is not None:
+                    self._iteration_range = (0, best_iteration + 1)
+            
             return True
             
         except Exception as e:
@@ -77,12 +105,42 @@ class ModelLoader:
         """Check if model is loaded."""
         return self.model is not None
     
-    def predict_proba(self, features: pd.DataFrame) -> np.ndarray:
+    def _map_columns(self, feature_order: Optional[List[str]]) -> Optional[np.ndarray]:
+        """
+        Indices that reorder feature_order columns into the model's order.
+        
+        Features the model expects but feature_order lacks point one past
+        the last column, which predict_proba fills with 0.
+        """
+        if not feature_order or not self.feature_names or list(feature_order) == list(self.feature_names):
+            return None
+        
+        position = {name: i for i, name in enumerate(feature_order)}
+        missing = [f for f in self.feature_names if f not in position]
+        if missing:
+            log.warning(f"Missing features (will use 0): {missing}")
+        
+        return np.array(
+            [position.get(f, len(feature_order)) for f in self.feature_names],
+            dtype=np.intp,
+        )
+    
+    def _cache_importances(self, feature_order: List[str]) -> None:
+        """Store the importances of the features in feature_order as arrays."""
+        importances = self.get_feature_importances()
+        known = [(name, i) for i, name in enumerate(feature_order) if name in importances]
+        
+        self._imp_names = np.array([name for name, _ in known], dtype=object)
+        self._imp_index = np.array([i for _, i in known], dtype=np.intp)
+        self._imp_values = np.array([importances[name] for name, _ in known], dtype=np.float32)
+    
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
         """
         Get fraud probability for transactions.
         
         Args:
-            features: DataFrame with features (one row per transaction)
+            features: 2-D array, one row per transaction, columns in the
+                feature order given to load()
         
         Returns:
             Array of fraud probabilities (0-1)
@@ -91,22 +149,28 @@ class ModelLoader:
             raise RuntimeError("Model not loaded. Call load() first.")
         
         # Ensure feature order matches what model expects
-        if self.feature_names:
-            # Only use features the model knows about
-            available = [f for f in self.feature_names if f in features.columns]
-            missing = [f for f in self.feature_names if f not in features.columns]
-            
-            if missing:
-                log.warning(f"Missing features (will use 0): {missing}")
-                for f in missing:
-                    features[f] = 0
-            
-            features = features[self.feature_names]
+        if self._columns is not None:
+            padded = np.zeros((features.shape[0], features.shape[1] + 1), dtype=features.dtype)
+            padded[:, :-1] = features
+            features = padded[:, self._columns]
         
         # Get probability of class 1 (fraud)
+        if self._booster is not None:
+            proba = self._booster.inplace_predict(features, iteration_range=self._iteration_range)
+            return proba if proba.ndim == 1 else proba[:, 1]
+        
         proba = self.model.predict_proba(features)
         return proba[:, 1]
     
+    def get_importance_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Feature importances as cached by load().
+        
+        Returns:
+            (names, positions in the rows passed to predict_proba, importances)
+        """
+        return self._imp_names, self._imp_index, self._imp_values
+    
     def get_feature_importances(self) -> dict:
         """
         Get feature importances from the model.
@@ -125,5 +189,110 @@ class ModelLoader:
         return {}
 
 
+class PredictBatcher:
+    """
+    Scores concurrent requests together in one model call.
+    
+    submit() puts a row on an asyncio.Queue and waits for its score; a
+    background task takes up to max_batch rows (or whatever arrived within
+    max_delay_s of the first), stacks them and scores them with a single
+    predict_proba call in a worker thread, so the next batch can gather
+    while this one is scored.
+    
+    Usage (from the FastAPI lifespan):
+        await predict_batcher.start()
+        ...
+        await predict_batcher.stop()   # scores whatever is still queued
+    """
+    
+    def __init__(
+        self,
+        loader: ModelLoader,
+        max_batch: int = config.scoring.predict_batch_size,
+        max_delay_s: float = config.scoring.predict_batch_delay_ms / 1000,
+    ):
+        self.loader = loader
+        self.max_batch = max_batch
+        self.max_delay_s = max_delay_s
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self) -> None:
+        """Start the background scorer."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="predict-batcher")
+    
+    async def stop(self) -> None:
+        """Score everything still queued, then stop the task."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+    
+    async def submit(self, row: np.ndarray) -> float:
+        """
+        Fraud probability for one transaction.
+        
+        Args:
+            row: (1, n_features) array, as passed to ModelLoader.predict_proba
+        """
+        if self._task is None or self._task.done():
+            # Not started (or stopped): score directly
+            return float(self.loader.predict_proba(row)[0])
+        
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, future))
+        return await future
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch: List[Tuple[np.ndarray, asyncio.Future]] = []
+            item = await self._queue.get()
+            deadline = loop.time() + self.max_delay_s
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            
+            if batch:
+                await self._score(loop, batch)
+    
+    async def _score(self, loop: asyncio.AbstractEventLoop, batch: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        """Score a batch and resolve each request's future."""
+        try:
+            rows = np.vstack([row for row, _ in batch])
+            scores = await loop.run_in_executor(None, self.loader.predict_proba, rows)
+        except Exception as e:
+            log.exception(f"Batch prediction failed for {len(batch)} rows: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), score in zip(batch, scores.tolist()):
+            # The request may have been cancelled while we were scoring
+            if not future.done():
+                future.set_result(score)
+
+
 # Global model instance (loaded once at startup)
 model_loader = ModelLoader()
+predict_batcher = PredictBatcher(model_loader)
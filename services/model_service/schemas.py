@@ -138,8 +138,10 @@ class ScoreResponse(BaseModel):
     latency_ms: int = Field(..., description="Scoring latency in milliseconds")
     
     # Alert info (if created)
-    alert_created: bool = Field(..., description="Whether an alert was created")
-    alert_id: Optional[int] = Field(None, description="Alert ID if created")
+    alert_created: bool = Field(
+        ...,
+        description="Whether an alert was queued for writing (written in the background; see fraud_alerts_lost_total)"
+    )
     
     class Config:
         json_schema_extra = {
@@ -163,8 +165,7 @@ class ScoreResponse(BaseModel):
                 "model_version": "1",
                 "scored_at": "2026-01-27T21:30:00Z",
                 "latency_ms": 23,
-                "alert_created": True,
-                "alert_id": 12345
+                "alert_created": True
             }
         }
 
@@ -13,17 +13,22 @@ import signal
 import sys
 import time
 from datetime import datetime
+from functools import lru_cache
 from typing import Any, Dict
 from threading import Thread
 
 import psycopg2
 import psycopg2.extras
 from kafka import KafkaConsumer
-from prometheus_client import Counter, Histogram, Gauge, start_http_server
+from prometheus_client import Counter, Gauge, Summary, disable_created_metrics, start_http_server
 
 from db import connect_with_retry, insert_raw_event
 
 
+# Skip the per-child *_created samples; nothing consumes them and they add
+# a line per counter/histogram child to every scrape
+disable_created_metrics()
+
 # ============================================================================
 # PROMETHEUS METRICS
 # ============================================================================
@@ -34,22 +39,24 @@ MESSAGES_PROCESSED = Counter(
     ['status']
 )
 
+# Per-partition lag multiplies series with every partition added to the
+# topic, so it is opt-in. By default lag is summed per consumer group.
+PARTITION_LAG_LABELS = os.getenv("METRICS_PARTITION_LABELS", "false").lower() == "true"
+
 CONSUMER_LAG = Gauge(
     'fraud_consumer_lag',
     'Consumer lag (messages behind)',
-    ['consumer_group', 'partition']
+    ['consumer_group', 'partition'] if PARTITION_LAG_LABELS else ['consumer_group']
 )
 
-PROCESSING_TIME = Histogram(
+PROCESSING_TIME = Summary(
     'fraud_stream_consumer_processing_seconds',
-    'Time to process a single message',
-    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+    'Time to process a single message'
 )
 
-DB_WRITE_LATENCY = Histogram(
+DB_WRITE_LATENCY = Summary(
     'fraud_stream_consumer_db_write_seconds',
-    'Database write latency for raw_events',
-    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+    'Database write latency for raw_events'
 )
 
 BATCH_SIZE = Gauge(
@@ -58,6 +65,17 @@ BATCH_SIZE = Gauge(
 )
 
 
+# Labelled children, memoized so the per-message path skips .labels()
+@lru_cache(maxsize=None)
+def messages_processed(status: str) -> Counter:
+    return MESSAGES_PROCESSED.labels(status=status)
+
+
+@lru_cache(maxsize=256)
+def consumer_lag(*label_values: str) -> Gauge:
+    return CONSUMER_LAG.labels(*label_values)
+
+
 def setup_logger(level: str) -> None:
     logging.basicConfig(
         level=getattr(logging, level.upper(), logging.INFO),
@@ -153,10 +171,10 @@ def main() -> None:
                     conn.commit()
                     DB_WRITE_LATENCY.observe(time.time() - db_start)
                     
-                    MESSAGES_PROCESSED.labels(status='success').inc()
+                    messages_processed('success').inc()
                 except Exception as e:
                     conn.rollback()
-                    MESSAGES_PROCESSED.labels(status='error').inc()
+                    messages_processed('error').inc()
                     log.exception("DB insert failed (will NOT commit Kafka offset). Error=%s", e)
                     break
 
@@ -174,15 +192,16 @@ def main() -> None:
                     
                     # Update lag metrics
                     try:
-                        partitions = consumer.assignment()
+                        partitions = list(consumer.assignment())
+                        end_offsets = consumer.end_offsets(partitions)
+                        total_lag = 0
                         for tp in partitions:
-                            end_offsets = consumer.end_offsets([tp])
-                            current_offset = consumer.position(tp)
-                            lag = end_offsets[tp] - current_offset
-                            CONSUMER_LAG.labels(
-                                consumer_group=group_id,
-                                partition=str(tp.partition)
-                            ).set(lag)
+                            lag = end_offsets[tp] - consumer.position(tp)
+                            total_lag += lag
+                            if PARTITION_LAG_LABELS:
+                                consumer_lag(group_id, str(tp.partition)).set(lag)
+                        if not PARTITION_LAG_LABELS:
+                            consumer_lag(group_id).set(total_lag)
                     except Exception:
                         pass
                     
@@ -0,0 +1,79 @@
+"""
+PSI regression tests for the drift detector.
+
+Mostly-constant features (flags, unique_countries_24h) put most of the
+reference on one value, so several quantile edges coincide. Those used
+to collapse into a single bin and report PSI 0 whatever the shift.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "services", "drift_detector"))
+
+from drift_checks import (  # noqa: E402
+    ReferenceHistogram,
+    calculate_psi,
+    calculate_simple_drift_metrics,
+)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+
+def _column(rng, n, p_rare, common=1.0, rare=2.0):
+    return np.where(rng.random(n) < p_rare, rare, common).reshape(-1, 1)
+
+
+def test_mostly_constant_reference_gets_own_bin(rng):
+    hist = ReferenceHistogram(_column(rng, 5000, 0.05))
+
+    # Exactly the common value is separated from everything above it
+    assert np.isinf(hist.inner[:, 0]).sum() == hist.bins - 3
+    hist.update(_column(rng, 2000, 0.40))
+    assert hist.psi()[0] > 0.25
+
+
+def test_frozen_reference_tracks_each_window(rng):
+    hist = ReferenceHistogram(_column(rng, 5000, 0.05))
+
+    for _ in range(4):
+        hist.update(_column(rng, 500, 0.05))
+    assert hist.psi()[0] < 0.1
+
+    hist.reset()
+    for _ in range(4):
+        hist.update(_column(rng, 500, 0.40))
+    assert hist.psi()[0] > 0.25
+
+
+def test_continuous_columns_keep_quantile_edges(rng):
+    reference = rng.lognormal(4, 1, size=(5000, 1))
+    hist = ReferenceHistogram(reference)
+
+    expected = np.nanquantile(reference, np.linspace(0, 1, 11)[1:-1], axis=0)
+    np.testing.assert_array_equal(hist.inner, expected)
+
+
+def test_unique_countries_shift_is_detected(rng):
+    # ~95% of transactions come from one country in the reference window
+    reference = {"unique_countries_24h": _column(rng, 5000, 0.05).ravel()}
+    current = {"unique_countries_24h": _column(rng, 2000, 0.40).ravel()}
+
+    result = calculate_simple_drift_metrics(reference, current, ["unique_countries_24h"])
+    assert result["unique_countries_24h"]["psi"] > 0.25
+    assert result["unique_countries_24h"]["drift_detected"]
+
+
+@pytest.mark.parametrize("p_ref", [0.02, 0.05, 0.08, 0.92, 0.98])
+def test_flag_shift_is_detected(rng, p_ref):
+    reference = _column(rng, 5000, p_ref, common=0.0, rare=1.0).ravel()
+    current = _column(rng, 2000, 0.30 if p_ref < 0.5 else 0.70, common=0.0, rare=1.0).ravel()
+
+    assert calculate_psi(reference, current) > 0.25
+    assert calculate_psi(reference, _column(rng, 2000, p_ref, common=0.0, rare=1.0).ravel()) < 0.1